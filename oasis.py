@@ -2,13 +2,35 @@
 """oasis.py - 최종 완성본 (정액제 재등록 시 방문 카운트 추가 + 메모 기능 추가)"""
 
 import streamlit as st
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
-import pytz
+import hashlib
+import os
 import time
+import pytz
+
+from oasis_sheet import (
+    SPREADSHEET_TITLE,
+    add_product_changes,
+    authorize,
+    ensure_header,
+    memo_changes,
+    raw_records,
+    renew_fixed_changes,
+    ticket_count,
+    topup_changes,
+    visit_changes,
+)
+from oasis_analytics import TICKET_BUCKETS, VISIT_GROUPS, build_report
+from oasis_archive import ensure_archive_worksheet
+from oasis_journal import Journal
+from oasis_metrics import QUOTA_PER_MINUTE, Metrics, instrument, json_logger
+from oasis_ocr import PlateReader, rank_plates
+from oasis_recompute import days_left_changes
+from oasis_storage import SheetsStorage, SQLiteStorage
+from oasis_visits import ensure_visit_worksheet
 
 # --- 1. 기본 설정 및 데이터 로딩 ---
+rerun_started = time.perf_counter()
 st.set_page_config(layout="centered")
 
 now = datetime.now(pytz.timezone("Asia/Seoul"))
@@ -16,394 +38,584 @@ today = now.strftime("%Y-%m-%d")
 now_str = now.strftime("%Y-%m-%d %H:%M")
 
 @st.cache_resource
-def get_gspread_client():
-    scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    credentials = Credentials.from_service_account_info(st.secrets["gcp_service_account"], scopes=scopes)
-    return gspread.authorize(credentials)
+def get_metrics():
+    """계측 (secrets 의 [metrics] log 또는 OASIS_METRICS_LOG 에 경로를 주면 JSON 로그도 남김, '-' 는 표준 에러)"""
+    log_path = os.environ.get("OASIS_METRICS_LOG", dict(st.secrets.get("metrics", {})).get("log", ""))
+    return Metrics(logger=json_logger(log_path) if log_path else None)
 
-@st.cache_data(ttl=60)
-def load_data(_client):
-    with st.spinner("🔄 데이터를 새로 불러오는 중..."):
-        worksheet = _client.open("Oasis Customer Management").sheet1
-        return worksheet.get_all_records()
+metrics = get_metrics()
+session_metrics = st.session_state.setdefault("session_metrics", {})
 
-client = get_gspread_client()
-worksheet = client.open("Oasis Customer Management").sheet1
-all_records = load_data(client)
+@st.cache_resource
+def get_gspread_client():
+    with metrics.timed("authorize"):
+        return authorize(st.secrets["gcp_service_account"])
 
-정액제옵션 = ["기본(정액제)", "중급(정액제)", "고급(정액제)"]
-회수제옵션 = ["일반 5회권", "중급 5회권", "고급 5회권", "일반 10회권", "중급 10회권", "고급 10회권", "고급 1회권"]
+# 스프레드시트/워크시트 핸들은 프로세스당 한 번만 열어 둠
+# (rerun 마다 제목 검색 + 메타데이터 조회를 하지 않도록, 데이터 재로딩과도 무관)
+@st.cache_resource
+def open_spreadsheet():
+    key = st.secrets.get("spreadsheet_key")
+    client = instrument(get_gspread_client(), metrics)
+    return instrument(client.open_by_key(key) if key else client.open(SPREADSHEET_TITLE), metrics)
 
-def get_customer(plate, records):
-    customer = next((r for r in records if r.get("차량번호") == plate), None)
-    row_idx = next((i + 2 for i, r in enumerate(records) if r.get("차량번호") == plate), None)
-    return customer, row_idx
+@st.cache_resource
+def open_worksheet():
+    with metrics.timed("fetch_sheet_metadata"):
+        worksheet = instrument(open_spreadsheet().sheet1, metrics)
+    ensure_header(worksheet)  # R열 '버전' 헤더가 없던 시트면 한 번 채움
+    return worksheet
 
-def clear_all_cache():
-    st.cache_data.clear()
-    st.cache_resource.clear()
+@st.cache_resource
+def open_visit_worksheet():
+    return instrument(ensure_visit_worksheet(open_spreadsheet()), metrics)
 
+@st.cache_resource
+def open_archive_worksheet():
+    return instrument(ensure_archive_worksheet(open_spreadsheet()), metrics)
 
-def _to_int(v, default=0):
-    try:
-        return int(str(v).strip())
-    except Exception:
-        return default
-
-def keep_last_n_logs(visit_str: str, n: int = 60) -> str:
-    """방문기록(L열)을 콤마(,) 기준으로 분리해 최신 n개만 유지."""
-    if not visit_str:
-        return ""
-    logs = [x.strip() for x in str(visit_str).split(",") if x.strip()]
-    return ", ".join(logs[-n:])
-
-def update_reregistration_index(worksheet, row_idx: int, customer: dict, now_str: str, rereg_type: str):
+@st.cache_resource
+def get_storage():
     """
-    재등록 인덱스 컬럼 업데이트:
-      N(14): 재등록 여부 = Y
-      O(15): 재등록 횟수 = 누적 정수
-      P(16): 최근 재등록일 = now_str
-      Q(17): 최근 재등록 유형 = '정액제' 또는 '회수제'
+    저장소 선택 (secrets 의 [storage] 또는 환경변수 OASIS_STORAGE):
+      sheets : 구글 시트 직접 사용 (기본값)
+      sqlite : 로컬 SQLite 에서 읽고 쓰며, sync_interval 초마다 시트로 일괄 반영
+               (sync_interval = 0 이면 시트 없이 오프라인으로 동작)
+    sheets 는 journal 파일(기본 oasis_journal.db, "" 이면 끔)에 쓰기를 먼저 남기고
+    시트가 느리거나 끊겨도 마지막 저장본으로 계속 동작한다.
     """
-    current_cnt = _to_int(customer.get("재등록 횟수", 0), 0)
-    new_cnt = current_cnt + 1
-    worksheet.update_cell(row_idx, 14, "Y")
-    worksheet.update_cell(row_idx, 15, str(new_cnt))
-    worksheet.update_cell(row_idx, 16, now_str)
-    worksheet.update_cell(row_idx, 17, str(rereg_type))
-
-for key in ["registration_success", "registering", "reset_form", "matched_plate", "last_search"]:
-    if key not in st.session_state:
-        st.session_state[key] = None
-
-# --- 2. UI 구조 ---
-
-st.markdown("<h3 style='text-align: center; font-weight:bold;'>🚘 오아시스 고객 관리</h3>", unsafe_allow_html=True)
-
-tab1, tab2 = st.tabs(["**기존 고객 관리**", "**신규 고객 등록**"])
-
-# -------------------------------------------------------------------
-# TAB 1 : 기존 고객 관리
-# -------------------------------------------------------------------
-with tab1:
-    with st.form("search_form"):
-        search_input = st.text_input("🔍 차량 번호 (전체 또는 끝 4자리)", key="search_input", placeholder="예: 1234")
-        submitted = st.form_submit_button("검색", use_container_width=True)
-
-    if submitted and search_input.strip():
-        matched = [r for r in all_records if search_input.strip() in str(r.get("차량번호", ""))]
-        if not matched:
-            st.info("🚫 등록되지 않은 차량입니다. '신규 고객 등록' 탭을 이용해 주세요.")
-            st.session_state.matched_plate = None
-        else:
-            options = {}
-            for r in matched:
-                plate = r.get("차량번호")
-                jung = r.get("상품 옵션(정액제)", "없음") or "없음"
-                hue = r.get("상품 옵션(회수제)", "없음") or "없음"
-                label = f"{plate} → 정액제: {jung} / 회수제: {hue}"
-                options[label] = plate
-            st.session_state.matched_options = options
-            st.session_state.matched_plate = list(options.values())[0]
-
-    if st.session_state.get("matched_plate"):
-        plate = st.session_state["matched_plate"]
-        label_options = list(st.session_state.matched_options.keys())
-        value_options = list(st.session_state.matched_options.values())
+    config = dict(st.secrets.get("storage", {}))
+    backend = os.environ.get("OASIS_STORAGE", config.get("backend", "sheets"))
+    if backend == "sqlite":
+        storage = SQLiteStorage(config.get("path", "oasis.db"))
+        interval = float(config.get("sync_interval", 30))
+        if interval > 0:
+            if storage.is_empty():
+                storage.import_records(raw_records(open_worksheet()))
+                storage.import_records(raw_records(open_archive_worksheet()), on_sheet=False)
+                storage.import_visits(open_visit_worksheet().get_all_values()[1:])
+            storage.start_sync(open_worksheet, open_visit_worksheet, interval=interval)
+        return storage
+    # 클라이언트 리소스는 유지한 채 레코드만 TTL(60초) 로 재로딩, 쓰기는 큐에서 반영
+    # 보관 시트는 고객 시트에서 못 찾았을 때만 읽음
+    journal_path = config.get("journal", "oasis_journal.db")
+    return SheetsStorage(
+        open_worksheet, open_visit_worksheet, ttl=60,
+        archive_worksheet_getter=open_archive_worksheet,
+        journal=Journal(journal_path) if journal_path else None,
+        timeout=float(config.get("timeout", 15)),
+    )
+
+@st.cache_resource
+def get_plate_reader():
+    """번호판 인식기 (OpenCV/Tesseract 가 없으면 None → 촬영 입력 대신 안내만)"""
+    try:
+        return PlateReader()
+    except (ImportError, OSError):
+        return None
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_report(version, day, _storage):
+    """통계 탭 집계. 데이터 버전/날짜가 같으면 rerun 마다 다시 계산하지 않음 (_storage 는 해시 제외)"""
+    return build_report(_storage.load(), _storage.visit_counts(), day)
+
+def flash(message, icon="✅"):
+    """다음 rerun 에서 토스트로 보여줄 메시지 (sleep 없이 바로 st.rerun() 가능)"""
+    st.session_state.setdefault("flash", []).append((message, icon))
+
+def show_flash():
+    for message, icon in st.session_state.pop("flash", []):
+        st.toast(message, icon=icon)
+
+def load_data(force=False):
+    # TTL 만료/강제 새로고침일 때만 전체 재로딩 (스피너 표시)
+    miss = force or storage.is_stale()
+    metrics.record_cache("load_data", hit=not miss, session=session_metrics)
+    if miss:
+        with st.spinner("🔄 데이터를 새로 불러오는 중..."):
+            try:
+                storage.load(force=force)
+            except Exception as e:
+                # 저장본도 없는 첫 실행에서 시트가 안 되는 경우
+                st.error(f"❌ 고객 시트에 연결할 수 없습니다. 잠시 후 새로고침해 주세요. ({type(e).__name__}: {e})")
+                st.stop()
+
+# st.rerun() / st.stop() 은 예외로 스크립트를 끝내므로, 기록 후 rerun 도 재려면 finally 에서 기록
+try:
+    storage = get_storage()
+    show_flash()
+    load_data(force=st.sidebar.button("🔄 데이터 새로고침"))
+
+    정액제옵션 = ["기본(정액제)", "중급(정액제)", "고급(정액제)"]
+    회수제옵션 = ["일반 5회권", "중급 5회권", "고급 5회권", "일반 10회권", "중급 10회권", "고급 10회권", "고급 1회권"]
+
+    def render_write_status():
+        """사이드바: 시트 반영 대기/실패 현황 (시트 연결이 끊기면 본문 상단에도 표시)"""
+        status = storage.status()
+        if status["offline"]:
+            if status["snapshot_at"] is None:
+                saved = "마지막"
+            else:
+                saved = datetime.fromtimestamp(status["snapshot_at"], pytz.timezone("Asia/Seoul")).strftime("%m-%d %H:%M")
+            st.warning(
+                f"📴 구글 시트에 연결되지 않아 {saved} 저장본으로 보여줍니다. "
+                "기록은 이 기기에 저장되고 연결되면 자동으로 전송됩니다."
+            )
+        if status["failed"]:
+            st.sidebar.error(f"❌ 시트 반영 실패 {status['failed']}건")
+            with st.sidebar.expander("실패 내역"):
+                for item in status["failed_items"]:
+                    target = f"수정 {len(item['rows'])}행 · 신규 {len(item['appends'])}건 · 방문 {len(item['visits'])}건"
+                    st.caption(f"{item['at']} · {target} · {item['error']}")
+            if st.sidebar.button("🔁 실패한 기록 다시 보내기", use_container_width=True):
+                storage.retry_failed()
+                st.rerun()
+        if status["pending"]:
+            msg = f"⏳ 시트 반영 대기 {status['pending']}건"
+            if status["attempt"]:
+                msg += f" (재시도 {status['attempt']}회 · {status['last_error']})"
+            st.sidebar.warning(msg)
+        elif not status["failed"]:
+            st.sidebar.caption("✅ 모든 기록이 시트에 반영됨")
+        if status["conflicts"]:
+            # 다른 단말이 같은 고객을 먼저 고친 경우: 카운터는 최신 값 기준으로 반영됐으니 내용만 확인
+            st.sidebar.warning(f"🔀 다른 단말과 동시 수정 {len(status['conflicts'])}건")
+            with st.sidebar.expander("동시 수정 내역"):
+                for item in status["conflicts"]:
+                    st.caption(f"{item['at']} · {item['plate']} · {item['reason']}")
+            if st.sidebar.button("확인", key="clear_conflicts", use_container_width=True):
+                storage.clear_conflicts()
+                st.rerun()
+
+    def is_admin():
+        """secrets 의 admin_password 를 사이드바에 입력한 경우만 관리자"""
+        password = st.secrets.get("admin_password")
+        if not password:
+            return False
+        return st.sidebar.text_input("🔑 관리자 비밀번호", type="password", key="admin_password") == password
+
+    def _ms(value):
+        return f"{value:.0f}ms" if value is not None else "-"
+
+    def _pct(value):
+        return f"{value * 100:.0f}%" if value is not None else "-"
+
+    def render_metrics_panel():
+        """관리자 사이드바: 분당 시트 호출(한도 대비), rerun p50/p95, load_data 캐시 적중률"""
+        with st.sidebar.expander("📈 성능 지표"):
+            reads, writes = metrics.calls_per_minute()
+            st.caption(f"최근 1분 시트 호출: 읽기 {reads}/{QUOTA_PER_MINUTE} · 쓰기 {writes}/{QUOTA_PER_MINUTE}")
+            if max(reads, writes) >= QUOTA_PER_MINUTE * 0.8:
+                st.warning("⚠️ 분당 한도에 근접")
+
+            p50, p95 = metrics.rerun_percentiles()
+            s50, s95 = metrics.rerun_percentiles(session_metrics)
+            snap = metrics.snapshot()
+            st.caption(f"rerun 전체 p50 {_ms(p50)} · p95 {_ms(p95)} / 이 세션 p50 {_ms(s50)} · p95 {_ms(s95)}")
+            st.caption(
+                f"load_data 캐시 적중률 전체 {_pct(Metrics.hit_rate(snap['cache'], 'load_data'))}"
+                f" / 이 세션 {_pct(Metrics.hit_rate(session_metrics.get('cache', {}), 'load_data'))}"
+            )
+            rows = [
+                {
+                    "호출": method,
+                    "횟수": count,
+                    "평균ms": round(snap["call_ms"][method] / count, 1),
+                    "오류": snap["errors"][method],
+                }
+                for method, count in snap["calls"].most_common()
+            ]
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    def render_admin_tools():
+        render_metrics_panel()
+        with st.sidebar.expander("🛠️ 관리자 도구"):
+            if st.button("📅 남은 이용 일수 일괄 재계산", use_container_width=True):
+                changes = days_left_changes(storage.load(), today)
+                storage.update_many(changes)
+                st.success(f"✅ {len(changes)}명 갱신")
+            if isinstance(storage, SheetsStorage):
+                months = st.number_input("보관 기준 (개월 동안 활동 없음)", min_value=1, max_value=60, value=6)
+                if st.button("📦 오래된 고객 보관 시트로 이동", use_container_width=True):
+                    with st.spinner("보관 시트로 옮기는 중..."):
+                        n = storage.archive_inactive(open_spreadsheet(), int(months), today)
+                    if n is None:
+                        st.warning("⚠️ 아직 시트에 반영되지 않은 기록이 있어 보관하지 않았습니다. 잠시 후 다시 시도해 주세요.")
+                    else:
+                        st.success(f"✅ {n}명 이동")
+
+
+    render_write_status()
+    if is_admin():
+        render_admin_tools()
+
+    for key in ["registration_success", "registering", "reset_form", "matched_plate", "last_search"]:
+        if key not in st.session_state:
+            st.session_state[key] = None
+
+    def select_matches(matched):
+        """검색/번호판 인식 결과 → 고객 선택 목록 (첫 번째 고객 선택)"""
+        options = {}
+        for r in matched:
+            plate = r.get("차량번호")
+            jung = r.get("상품 옵션(정액제)", "없음") or "없음"
+            hue = r.get("상품 옵션(회수제)", "없음") or "없음"
+            label = f"{plate} → 정액제: {jung} / 회수제: {hue}"
+            options[label] = plate
+        st.session_state.matched_options = options
+        st.session_state.matched_plate = list(options.values())[0]
+
+    def render_plate_camera():
+        """입구에서 번호판을 찍으면 끝 4자리 색인으로 후보를 찾아 바로 선택"""
+        reader = get_plate_reader()
+        if reader is None:
+            st.caption("번호판 인식을 쓸 수 없습니다 (OpenCV/Tesseract 미설치). 번호를 직접 입력해 주세요.")
+            return
+        photo = st.camera_input("번호판이 화면 가운데 오도록 촬영", key="plate_photo", label_visibility="collapsed")
+        if photo is None:
+            return
+        data = photo.getvalue()
+        digest = hashlib.sha1(data).hexdigest()
+        # 같은 사진으로 rerun 될 때는 다시 인식하지 않음
+        if st.session_state.get("plate_photo_digest") != digest:
+            st.session_state.plate_photo_digest = digest
+            readings, ms = reader.read(data)
+            ranked = rank_plates(readings, storage.find_by_suffix)
+            st.session_state.plate_ocr = (readings, ms, ranked)
+            if ranked:
+                select_matches([c for c in (storage.get(plate) for plate, _ in ranked) if c])
+        readings, ms, ranked = st.session_state.plate_ocr
+        st.caption(f"인식: {', '.join(readings) or '없음'} · {ms:.0f}ms")
+        if not ranked:
+            st.info("🚫 일치하는 차량을 찾지 못했습니다. 번호를 직접 입력해 주세요.")
+
+    # --- 2. UI 구조 ---
+
+    st.markdown("<h3 style='text-align: center; font-weight:bold;'>🚘 오아시스 고객 관리</h3>", unsafe_allow_html=True)
+
+    tab1, tab2, tab3 = st.tabs(["**기존 고객 관리**", "**신규 고객 등록**", "**통계**"])
+
+    # -------------------------------------------------------------------
+    # TAB 1 : 기존 고객 관리
+    # -------------------------------------------------------------------
+    with tab1:
+        with st.expander("📷 번호판 촬영으로 찾기"):
+            render_plate_camera()
+
+        with st.form("search_form"):
+            search_input = st.text_input("🔍 차량 번호 (전체 또는 끝 4자리)", key="search_input", placeholder="예: 1234")
+            submitted = st.form_submit_button("검색", use_container_width=True)
+
+        if submitted and search_input.strip():
+            matched = storage.search(search_input.strip())
+            if not matched:
+                st.info("🚫 등록되지 않은 차량입니다. '신규 고객 등록' 탭을 이용해 주세요.")
+                st.session_state.matched_plate = None
+            else:
+                select_matches(matched)
+
+        if st.session_state.get("matched_plate"):
+            plate = st.session_state["matched_plate"]
+            label_options = list(st.session_state.matched_options.keys())
+            value_options = list(st.session_state.matched_options.values())
         
-        try:
-            current_index = value_options.index(plate)
-        except ValueError:
-            current_index = 0
+            try:
+                current_index = value_options.index(plate)
+            except ValueError:
+                current_index = 0
 
-        selected_label = st.selectbox("👇 검색된 고객 선택", label_options, index=current_index, key="customer_select")
+            selected_label = st.selectbox("👇 검색된 고객 선택", label_options, index=current_index, key="customer_select")
         
-        if st.session_state.matched_plate != st.session_state.matched_options[selected_label]:
-            st.session_state.matched_plate = st.session_state.matched_options[selected_label]
-            st.rerun()
-
-        customer, row_idx = get_customer(st.session_state.matched_plate, all_records)
-
-        if customer and row_idx:
-            # ─────────────────────────────────────────────
-            # 고객 정보 카드 (정액제/회수권/최근 방문/기간 내 이용)
-            # ─────────────────────────────────────────────
-            with st.container(border=True):
-                st.markdown(f"#### **{st.session_state.matched_plate}** 님 정보")
-
-                is_blacklist = str(customer.get("블랙리스트", "")).strip().upper() == "Y"
-                if is_blacklist:
-                    st.error("🚨 **블랙리스트 회원**")
-
-                상품정액 = customer.get("상품 옵션(정액제)", "")
-                상품회수 = customer.get("상품 옵션(회수제)", "")
-                방문기록 = customer.get("방문기록", "")
-                만료일 = customer.get("회원 만료일", "")
-                남은횟수 = int(customer.get("남은 이용 횟수", 0)) if str(customer.get("남은 이용 횟수")).isdigit() else 0
-
-                # 🔹 최근 방문일 계산
-                최근방문일 = "기록 없음"
-                if 방문기록:
-                    try:
-                        last_log = 방문기록.split(',')[-1].strip()
-                        최근방문일 = last_log.split(' ')[0]
-                    except IndexError:
-                        최근방문일 = "확인 불가"
-                
-                # 🔹 정액제 기간 내 방문횟수 계산
-                방문횟수_기간내 = 0
-                if 상품정액 and 만료일 not in [None, "", "None", "none"]:
-                    try:
-                        expire_date = datetime.strptime(만료일, "%Y-%m-%d").date()
-                        start_date = expire_date - timedelta(days=30)
-                        if 방문기록:
-                            visit_logs = 방문기록.split(',')
-                            for log in visit_logs:
-                                log_date_str = log.strip().split(' ')[0]
-                                log_date = datetime.strptime(log_date_str, "%Y-%m-%d").date()
-                                if start_date <= log_date <= expire_date:
-                                    방문횟수_기간내 += 1
-                    except:
-                        pass
+            if st.session_state.matched_plate != st.session_state.matched_options[selected_label]:
+                st.session_state.matched_plate = st.session_state.matched_options[selected_label]
+                st.rerun()
+
+            plate = st.session_state.matched_plate
+            customer = storage.get(plate)
+
+            if customer:
+                # ─────────────────────────────────────────────
+                # 고객 정보 카드 (정액제/회수권/최근 방문/기간 내 이용)
+                # ─────────────────────────────────────────────
+                with st.container(border=True):
+                    st.markdown(f"#### **{st.session_state.matched_plate}** 님 정보")
+                    if storage.is_archived(plate):
+                        st.info("📦 보관된 고객입니다. 방문·상품·메모를 기록하면 고객 목록으로 되돌아갑니다.")
+
+                    is_blacklist = str(customer.get("블랙리스트", "")).strip().upper() == "Y"
+                    if is_blacklist:
+                        st.error("🚨 **블랙리스트 회원**")
+
+                    상품정액 = customer.get("상품 옵션(정액제)", "")
+                    상품회수 = customer.get("상품 옵션(회수제)", "")
+                    만료일 = customer.get("회원 만료일", "")
+                    남은횟수 = int(customer.get("남은 이용 횟수", 0)) if str(customer.get("남은 이용 횟수")).isdigit() else 0
+
+                    # 🔹 최근 방문일 / 정액제 기간 내 방문횟수 (방문 이벤트 집계에서 바로 조회)
+                    expire_date = None
+                    if 상품정액 and 만료일 not in [None, "", "None", "none"]:
+                        try:
+                            expire_date = datetime.strptime(만료일, "%Y-%m-%d").date()
+                        except (TypeError, ValueError):
+                            pass
+                    최근방문일, 방문횟수_기간내 = storage.visit_summary(customer, expire_date)
+                    최근방문일 = 최근방문일 or "기록 없음"
                 
-                # 🔹 남은 일수 계산 및 시트 반영
-                days_left = -999
-                if 상품정액 and 만료일 not in [None, "", "None", "none"]:
-                    try:
-                        expire_date = datetime.strptime(만료일, "%Y-%m-%d").date()
+                    # 🔹 남은 일수 계산 (표시만, G열 갱신은 oasis_recompute 배치에서)
+                    days_left = -999
+                    if expire_date is not None:
                         days_left = (expire_date - now.date()).days
-                        if str(customer.get("남은 이용 일수")) != str(max(0, days_left)):
-                            worksheet.update_cell(row_idx, 7, str(max(0, days_left)))
-                    except:
-                        pass
                 
-                val1 = f"{days_left}일" if 상품정액 and days_left >= 0 else ("만료" if 상품정액 else "없음")
-                delta1 = f"~{만료일}" if 상품정액 else ""
-                val2 = f"{남은횟수}회" if 상품회수 else "없음"
-                val3 = 최근방문일
-                val4 = f"{방문횟수_기간내}회" if 상품정액 else ""
+                    val1 = f"{days_left}일" if 상품정액 and days_left >= 0 else ("만료" if 상품정액 else "없음")
+                    delta1 = f"~{만료일}" if 상품정액 else ""
+                    val2 = f"{남은횟수}회" if 상품회수 else "없음"
+                    val3 = 최근방문일
+                    val4 = f"{방문횟수_기간내}회" if 상품정액 else ""
                 
-                html_table = f"""
-                <style>
-                    .metric-table {{ width: 100%; border-collapse: collapse; margin-top: 1rem; }}
-                    .metric-table td {{ width: 50%; padding: 8px; text-align: center; vertical-align: top; }}
-                    .metric-label {{ font-size: 0.95rem; color: #555; margin-bottom: 0.25rem; }}
-                    .metric-value {{ font-size: 1.75rem; font-weight: 600; line-height: 1.2; }}
-                    .metric-delta {{ font-size: 0.8rem; color: #888; }}
-                    @media (prefers-color-scheme: dark) {{
-                        .metric-label {{ color: #aab; }}
-                        .metric-value {{ color: #fafafa; }}
-                        .metric-delta {{ color: #778; }}
-                    }}
-                </style>
-                <table class="metric-table">
-                    <tr>
-                        <td>
-                            <div class="metric-label">정액제</div>
-                            <div class="metric-value">{val1}</div>
-                            <div class="metric-delta">{delta1}</div>
-                        </td>
-                        <td>
-                            <div class="metric-label">회수권(남은횟수)</div>
-                            <div class="metric-value">{val2}</div>
-                            <div class="metric-delta">&nbsp;</div>
-                        </td>
-                    </tr>
-                    <tr>
-                        <td>
-                            <div class="metric-label">최근 방문</div>
-                            <div class="metric-value">{val3}</div>
-                            <div class="metric-delta">&nbsp;</div>
-                        </td>
-                        <td>
-                            <div class="metric-label">기간 내 이용</div>
-                            <div class="metric-value">{val4}</div>
-                            <div class="metric-delta">&nbsp;</div>
-                        </td>
-                    </tr>
-                </table>
-                """
-                st.markdown(html_table, unsafe_allow_html=True)
-
-                # 🔹🔹🔹 메모 UI 추가 (M열: 메모) 🔹🔹🔹
-                메모기존값 = customer.get("메모", "") or ""
-                if str(메모기존값).strip():
-                    st.markdown(
-                        f"""
-                        <div style="
-                            color:#d00000;
-                            font-weight:800;
-                            background:#fff1f1;
-                            border:1px solid #ffb3b3;
-                            padding:10px 12px;
-                            border-radius:10px;
-                            line-height:1.4;
-                            font-size:1.05rem;
-                        ">
-                        ⚠️ 메모: {메모기존값}
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-
-                with st.form("memo_form"):
-                    memo_input = st.text_area("📝 메모", value=메모기존값, height=80)
-                    memo_submitted = st.form_submit_button("메모 저장", use_container_width=True)
-                    if memo_submitted:
-                        # M열 = 13번째 컬럼에 메모 저장
-                        worksheet.update_cell(row_idx, 13, memo_input)
-                        st.success("✅ 메모가 저장되었습니다.")
-                        clear_all_cache()
-                        time.sleep(1)
-                        st.rerun()
-                # 🔹🔹🔹 메모 UI 끝 🔹🔹🔹
-            
-            # ─────────────────────────────────────────────
-            # 방문 기록 추가
-            # ─────────────────────────────────────────────
-            with st.container(border=True):
-                st.subheader("✅ 방문 기록 추가")
-                visit_options = []
-                if 상품정액 and days_left >= 0: 
-                    visit_options.append("정액제")
-                if 상품회수 and 남은횟수 > 0: 
-                    visit_options.append("회수제")
-
-                if visit_options:
-                    사용옵션 = st.radio("사용할 이용권 선택:", visit_options, horizontal=True)
-                    if st.button(f"**{사용옵션}으로 방문 기록하기**", use_container_width=True, type="primary"):
-                        log_type = 사용옵션
-                        if log_type == "회수제":
-                            worksheet.update_cell(row_idx, 9, str(남은횟수 - 1))
-                        count = int(customer.get("총 방문 횟수", 0)) + 1
-                        new_log_raw = f"{방문기록}, {now_str} ({log_type})" if 방문기록 else f"{now_str} ({log_type})"
-                        new_log = keep_last_n_logs(new_log_raw, 60)
-                        worksheet.update_cell(row_idx, 4, today)
-                        worksheet.update_cell(row_idx, 5, str(count))
-                        worksheet.update_cell(row_idx, 12, new_log)
-                        st.success(f"✅ {log_type} 방문 기록 완료")
-                        clear_all_cache()
-                        time.sleep(1)
-                        st.rerun()
-                else:
-                    st.warning("사용 가능한 이용권이 없습니다.")
-            
-            # ─────────────────────────────────────────────
-            # 상품 추가 / 갱신 / 충전
-            # ─────────────────────────────────────────────
-            with st.expander("🔄 상품 추가 / 갱신 / 충전"):
-                if (상품정액 and days_left < 0) or (상품회수 and 남은횟수 <= 0):
-                    st.info("만료/소진된 상품을 갱신 또는 충전합니다.")
-                    if 상품정액 and days_left < 0:
-                        sel = st.selectbox("정액제 갱신", 정액제옵션, key="재정액")
-                        if st.button("📅 정액제 갱신하기", use_container_width=True):
-                            # 1. 만료일 등 기본 정보 업데이트
-                            expire = now + timedelta(days=30)
-                            worksheet.update_cell(row_idx, 6, sel)
-                            worksheet.update_cell(row_idx, 7, "30")
-                            worksheet.update_cell(row_idx, 10, expire.strftime("%Y-%m-%d"))
-                            
-                            # 2. 방문기록에 (재등록) 로그 추가
-                            new_log_raw = f"{방문기록}, {now_str} (재등록)" if 방문기록 else f"{now_str} (재등록)"
-                            new_log = keep_last_n_logs(new_log_raw, 60)
-                            worksheet.update_cell(row_idx, 12, new_log)
-                            
-                            # 3. 총 방문 횟수 +1
-                            count = int(customer.get("총 방문 횟수", 0)) + 1
-                            worksheet.update_cell(row_idx, 5, str(count))
-                            
-                            # 4. 최근 방문일 오늘로
-                            worksheet.update_cell(row_idx, 4, today)
-
-                            # 4-1. 재등록 인덱스 업데이트 (N~Q)
-                            update_reregistration_index(worksheet, row_idx, customer, now_str, "정액제")
-
-                            # 5. 완료 및 새로고침
-                            st.success("✅ 재등록 및 방문 기록 완료")
-                            clear_all_cache()
-                            time.sleep(1)
+                    html_table = f"""
+                    <style>
+                        .metric-table {{ width: 100%; border-collapse: collapse; margin-top: 1rem; }}
+                        .metric-table td {{ width: 50%; padding: 8px; text-align: center; vertical-align: top; }}
+                        .metric-label {{ font-size: 0.95rem; color: #555; margin-bottom: 0.25rem; }}
+                        .metric-value {{ font-size: 1.75rem; font-weight: 600; line-height: 1.2; }}
+                        .metric-delta {{ font-size: 0.8rem; color: #888; }}
+                        @media (prefers-color-scheme: dark) {{
+                            .metric-label {{ color: #aab; }}
+                            .metric-value {{ color: #fafafa; }}
+                            .metric-delta {{ color: #778; }}
+                        }}
+                    </style>
+                    <table class="metric-table">
+                        <tr>
+                            <td>
+                                <div class="metric-label">정액제</div>
+                                <div class="metric-value">{val1}</div>
+                                <div class="metric-delta">{delta1}</div>
+                            </td>
+                            <td>
+                                <div class="metric-label">회수권(남은횟수)</div>
+                                <div class="metric-value">{val2}</div>
+                                <div class="metric-delta">&nbsp;</div>
+                            </td>
+                        </tr>
+                        <tr>
+                            <td>
+                                <div class="metric-label">최근 방문</div>
+                                <div class="metric-value">{val3}</div>
+                                <div class="metric-delta">&nbsp;</div>
+                            </td>
+                            <td>
+                                <div class="metric-label">기간 내 이용</div>
+                                <div class="metric-value">{val4}</div>
+                                <div class="metric-delta">&nbsp;</div>
+                            </td>
+                        </tr>
+                    </table>
+                    """
+                    st.markdown(html_table, unsafe_allow_html=True)
+
+                    # 🔹🔹🔹 메모 UI 추가 (M열: 메모) 🔹🔹🔹
+                    메모기존값 = customer.get("메모", "") or ""
+                    if str(메모기존값).strip():
+                        st.markdown(
+                            f"""
+                            <div style="
+                                color:#d00000;
+                                font-weight:800;
+                                background:#fff1f1;
+                                border:1px solid #ffb3b3;
+                                padding:10px 12px;
+                                border-radius:10px;
+                                line-height:1.4;
+                                font-size:1.05rem;
+                            ">
+                            ⚠️ 메모: {메모기존값}
+                            </div>
+                            """,
+                            unsafe_allow_html=True
+                        )
+
+                    with st.form("memo_form"):
+                        memo_input = st.text_area("📝 메모", value=메모기존값, height=80)
+                        memo_submitted = st.form_submit_button("메모 저장", use_container_width=True)
+                        if memo_submitted:
+                            # M열 메모 저장
+                            storage.update(plate, memo_changes(memo_input))
+                            flash("메모가 저장되었습니다.")
                             st.rerun()
-
-                    if 상품회수 and 남은횟수 <= 0:
-                        sel = st.selectbox("회수권 충전", 회수제옵션, key="재회수")
-                        if st.button("🔁 회수권 충전하기", use_container_width=True):
-                            cnt = 1 if "1회" in sel else (5 if "5회" in sel else 10)
-                            worksheet.update_cell(row_idx, 9, str(cnt))
-                            worksheet.update_cell(row_idx, 8, sel)
-                            
-                            # 재등록 인덱스 업데이트 (N~Q)
-                            update_reregistration_index(worksheet, row_idx, customer, now_str, "회수제")
-                            st.success("✅ 회수권 충전 완료")
-                            clear_all_cache()
+                    # 🔹🔹🔹 메모 UI 끝 🔹🔹🔹
+            
+                # ─────────────────────────────────────────────
+                # 방문 기록 추가
+                # ─────────────────────────────────────────────
+                with st.container(border=True):
+                    st.subheader("✅ 방문 기록 추가")
+                    visit_options = []
+                    if 상품정액 and days_left >= 0: 
+                        visit_options.append("정액제")
+                    if 상품회수 and 남은횟수 > 0: 
+                        visit_options.append("회수제")
+
+                    if visit_options:
+                        사용옵션 = st.radio("사용할 이용권 선택:", visit_options, horizontal=True)
+                        if st.button(f"**{사용옵션}으로 방문 기록하기**", use_container_width=True, type="primary"):
+                            log_type = 사용옵션
+                            # (회수제면 I열 -1) + D/E열 + 방문 로그
+                            storage.update(plate, visit_changes(log_type, today))
+                            storage.append_visit(plate, now_str, log_type)
+                            flash(f"{log_type} 방문 기록 완료")
                             st.rerun()
+                    else:
+                        st.warning("사용 가능한 이용권이 없습니다.")
+            
+                # ─────────────────────────────────────────────
+                # 상품 추가 / 갱신 / 충전
+                # ─────────────────────────────────────────────
+                with st.expander("🔄 상품 추가 / 갱신 / 충전"):
+                    if (상품정액 and days_left < 0) or (상품회수 and 남은횟수 <= 0):
+                        st.info("만료/소진된 상품을 갱신 또는 충전합니다.")
+                        if 상품정액 and days_left < 0:
+                            sel = st.selectbox("정액제 갱신", 정액제옵션, key="재정액")
+                            if st.button("📅 정액제 갱신하기", use_container_width=True):
+                                # 1~4. 만료일 갱신 + (재등록) 방문 로그 + 총 방문 횟수 + 최근 방문일
+                                #      + 재등록 인덱스(N~Q)
+                                storage.update(plate, renew_fixed_changes(sel, now, now_str, today))
+                                storage.append_visit(plate, now_str, "재등록")
+
+                                # 5. 완료 및 새로고침
+                                flash("재등록 및 방문 기록 완료")
+                                st.rerun()
+
+                        if 상품회수 and 남은횟수 <= 0:
+                            sel = st.selectbox("회수권 충전", 회수제옵션, key="재회수")
+                            if st.button("🔁 회수권 충전하기", use_container_width=True):
+                                # 충전 + 재등록 인덱스(N~Q) 한 번에 기록
+                                storage.update(plate, topup_changes(sel, now_str))
+                                flash("회수권 충전 완료")
+                                st.rerun()
                 
-                st.info("기존 고객에게 새로운 종류의 상품을 추가합니다.")
-                with st.form("add_product_form"):
-                    add_jung = st.selectbox("정액제 추가 등록", ["선택 안함"] + 정액제옵션)
-                    add_hue = st.selectbox("회수제 추가 등록", ["선택 안함"] + 회수제옵션)
-                    if st.form_submit_button("새 상품 추가하기", use_container_width=True):
-                        updated = False
-                        if add_jung != "선택 안함":
-                            expire = now + timedelta(days=30)
-                            worksheet.update_cell(row_idx, 6, add_jung)
-                            worksheet.update_cell(row_idx, 7, "30")
-                            worksheet.update_cell(row_idx, 10, expire.strftime("%Y-%m-%d"))
-                            st.success("✅ 정액제 추가 등록 완료")
-                            updated = True
-                        if add_hue != "선택 안함":
-                            cnt = 1 if "1회" in add_hue else (5 if "5회" in add_hue else 10)
-                            worksheet.update_cell(row_idx, 9, str(cnt))
-                            worksheet.update_cell(row_idx, 8, add_hue)
-                            st.success("✅ 회수제 추가 등록 완료")
-                            updated = True
-                        if updated:
-                            clear_all_cache()
-                            st.rerun()
-
-# -------------------------------------------------------------------
-# TAB 2 : 신규 고객 등록
-# -------------------------------------------------------------------
-with tab2:
-    with st.form("register_form"):
-        st.subheader("🆕 신규 고객 정보 입력")
-        np = st.text_input("🚘 차량번호", placeholder="12가 1234")
-        ph = st.text_input("📞 전화번호", placeholder="010-1234-5678")
-        st.markdown("---")
-        pj = st.selectbox("정액제 상품 (선택)", ["선택 안함"] + 정액제옵션)
-        phs = st.selectbox("회수제 상품 (선택)", ["선택 안함"] + 회수제옵션)
-
-        if st.form_submit_button("신규 고객으로 등록하기", use_container_width=True, type="primary"):
-            if np and ph:
-                exists = any(r.get("차량번호") == np for r in all_records)
-                if exists:
-                    st.warning("🚨 이미 등록된 차량번호입니다. '기존 고객 관리' 탭에서 검색해 보세요.")
+                    st.info("기존 고객에게 새로운 종류의 상품을 추가합니다.")
+                    with st.form("add_product_form"):
+                        add_jung = st.selectbox("정액제 추가 등록", ["선택 안함"] + 정액제옵션)
+                        add_hue = st.selectbox("회수제 추가 등록", ["선택 안함"] + 회수제옵션)
+                        if st.form_submit_button("새 상품 추가하기", use_container_width=True):
+                            changes = add_product_changes(
+                                add_jung if add_jung != "선택 안함" else None,
+                                add_hue if add_hue != "선택 안함" else None,
+                                now,
+                            )
+                            if changes:
+                                storage.update(plate, changes)
+                                if add_jung != "선택 안함":
+                                    flash("정액제 추가 등록 완료")
+                                if add_hue != "선택 안함":
+                                    flash("회수제 추가 등록 완료")
+                                st.rerun()
+
+    # -------------------------------------------------------------------
+    # TAB 2 : 신규 고객 등록
+    # -------------------------------------------------------------------
+    with tab2:
+        with st.form("register_form"):
+            st.subheader("🆕 신규 고객 정보 입력")
+            np = st.text_input("🚘 차량번호", placeholder="12가 1234")
+            ph = st.text_input("📞 전화번호", placeholder="010-1234-5678")
+            st.markdown("---")
+            pj = st.selectbox("정액제 상품 (선택)", ["선택 안함"] + 정액제옵션)
+            phs = st.selectbox("회수제 상품 (선택)", ["선택 안함"] + 회수제옵션)
+
+            if st.form_submit_button("신규 고객으로 등록하기", use_container_width=True, type="primary"):
+                if np and ph:
+                    exists = storage.exists(np)
+                    if exists:
+                        st.warning("🚨 이미 등록된 차량번호입니다. '기존 고객 관리' 탭에서 검색해 보세요.")
+                    else:
+                        phone = ph.replace("-", "").strip()
+                        jung_day = "30" if pj != "선택 안함" else ""
+                        expire = (now + timedelta(days=30)).strftime("%Y-%m-%d") if pj != "선택 안함" else ""
+                        cnt = ""
+                        if phs != "선택 안함":
+                            cnt = ticket_count(phs)
+                        # ⚠️ new_row는 기존과 동일 (메모 칸은 비워둔 상태로 시작)
+                        new_row = [
+                            np,                      # A 차량번호
+                            phone,                   # B 전화번호
+                            today,                   # C 등록일
+                            today,                   # D 최종 방문일
+                            1,                       # E 총 방문 횟수
+                            pj if pj != "선택 안함" else "",   # F 정액제 옵션
+                            jung_day,                # G 남은 이용 일수
+                            phs if phs != "선택 안함" else "", # H 회수제 옵션
+                            cnt,                     # I 남은 이용 횟수
+                            expire,                  # J 회원 만료일
+                            "",                      # K 블랙리스트
+                            "",                      # L 방문기록 (이관 전 기록용, 방문은 방문기록 시트에 이벤트로)
+                            # M 메모 (신규 등록 시 비워둠)
+                        ]
+                        storage.append_customer(new_row)
+                        storage.append_visit(np, now_str, "신규등록")
+                        flash("등록이 완료되었습니다!")
+                        st.rerun()
                 else:
-                    phone = ph.replace("-", "").strip()
-                    jung_day = "30" if pj != "선택 안함" else ""
-                    expire = (now + timedelta(days=30)).strftime("%Y-%m-%d") if pj != "선택 안함" else ""
-                    cnt = ""
-                    if phs != "선택 안함":
-                        cnt = 1 if "1회" in phs else (5 if "5회" in phs else 10)
-                    # ⚠️ new_row는 기존과 동일 (메모 칸은 비워둔 상태로 시작)
-                    new_row = [
-                        np,                      # A 차량번호
-                        phone,                   # B 전화번호
-                        today,                   # C 등록일
-                        today,                   # D 최종 방문일
-                        1,                       # E 총 방문 횟수
-                        pj if pj != "선택 안함" else "",   # F 정액제 옵션
-                        jung_day,                # G 남은 이용 일수
-                        phs if phs != "선택 안함" else "", # H 회수제 옵션
-                        cnt,                     # I 남은 이용 횟수
-                        expire,                  # J 회원 만료일
-                        "",                      # K 블랙리스트
-                        keep_last_n_logs(f"{now_str} (신규등록)", 60), # L 방문기록
-                        # M 메모 (신규 등록 시 비워둠)
-                    ]
-                    worksheet.append_row(new_row)
-                    st.success("✅ 등록이 완료되었습니다! 앱이 새로고침 됩니다.")
-                    clear_all_cache()
-                    time.sleep(2)
-                    st.rerun()
-            else:
-                st.error("차량번호와 전화번호는 필수 입력 항목입니다.")
+                    st.error("차량번호와 전화번호는 필수 입력 항목입니다.")
+
+    # -------------------------------------------------------------------
+    # TAB 3 : 통계
+    # -------------------------------------------------------------------
+    def _rate_rows(rates):
+        return [
+            {"상품": name, "고객 수": total, "재등록 고객": again, "재등록률": f"{rate * 100:.1f}%"}
+            for name, total, again, rate in rates
+        ]
+
+    def render_report(report):
+        st.metric("전체 고객", f"{report['customers']:,}명")
+
+        st.subheader("📅 일별 방문 (최근 4주)")
+        daily = report["daily"].tolist()
+        st.bar_chart(
+            {"날짜": report["dates"], **{g: [row[i] for row in daily] for i, g in enumerate(VISIT_GROUPS)}},
+            x="날짜", y=VISIT_GROUPS,
+        )
+        st.subheader("📆 주별 방문 (월요일 시작)")
+        weekly = report["weekly"].tolist()
+        st.bar_chart(
+            {"주": report["weeks"], **{g: [row[i] for row in weekly] for i, g in enumerate(VISIT_GROUPS)}},
+            x="주", y=VISIT_GROUPS,
+        )
+
+        st.subheader("🔁 상품별 재등록률")
+        st.caption("두 상품을 모두 쓰는 고객은 최근에 재등록한 상품에만 셉니다 (시트에는 재등록 횟수 합계와 최근 재등록 유형만 남음).")
+        col_fixed, col_ticket = st.columns(2)
+        with col_fixed:
+            st.caption("정액제")
+            st.dataframe(_rate_rows(report["rereg_fixed"]), hide_index=True, use_container_width=True)
+        with col_ticket:
+            st.caption("회수제")
+            st.dataframe(_rate_rows(report["rereg_ticket"]), hide_index=True, use_container_width=True)
+
+        st.subheader(f"⏰ 7일 안에 만료되는 정액제 ({len(report['expiring'])}명)")
+        if report["expiring"]:
+            st.dataframe(report["expiring"], hide_index=True, use_container_width=True)
+        else:
+            st.caption("없음")
+
+        st.subheader("🎟️ 회수권 남은 횟수 분포")
+        labels = [f"{n:02d}회" for n in range(TICKET_BUCKETS - 1)] + [f"{TICKET_BUCKETS - 1}회 이상"]
+        st.bar_chart({"남은 횟수": labels, "고객 수": report["tickets"].tolist()}, x="남은 횟수", y="고객 수")
+
+    with tab3:
+        # st.tabs 는 모든 탭 본문을 매 rerun 실행하므로, 집계는 버튼을 눌렀을 때만 (결과는 세션에 보관)
+        if st.button("📊 통계 불러오기 / 새로 계산", use_container_width=True):
+            with st.spinner("통계를 계산하는 중..."):
+                report = get_report(storage.data_version(), today, storage)
+            st.session_state.stats = (report, now.strftime("%H:%M"))
+        if st.session_state.get("stats") is None:
+            st.caption("버튼을 누르면 최근 방문·재등록률·만료 예정·회수권 현황을 계산합니다.")
+        else:
+            report, computed_at = st.session_state.stats
+            st.caption(f"{computed_at} 기준 · 다른 단말의 기록은 데이터 새로고침 후 다시 계산하면 반영됩니다.")
+            render_report(report)
+finally:
+    metrics.record_rerun(time.perf_counter() - rerun_started, session=session_metrics)
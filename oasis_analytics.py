@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""oasis_analytics.py - 통계 탭: 레코드를 열(column) 배열로 한 번 바꾼 뒤 NumPy 로 집계"""
+
+import re
+
+import numpy as np
+
+from oasis_sheet import parse_dates, to_int
+
+# 방문 유형 → 통계 묶음 (재등록 방문은 정액제 갱신과 함께 기록됨)
+VISIT_GROUPS = ["정액제", "회수제", "신규등록"]
+_GROUP = {"정액제": 0, "재등록": 0, "회수제": 1, "신규등록": 2}
+
+TICKET_BUCKETS = 11  # 남은 이용 횟수 0 ~ 10회 이상
+
+# L열 항목 '일시 (유형)' → (날짜, 유형). 고객마다 나누지 않고 전체를 한 번에 findall
+_LEGACY_DAY = re.compile(r"(\d{4}-\d{2}-\d{2})(?: \d{2}:\d{2})?\s*(?:\(([^(),]*)\))?")
+
+
+def _strings(records: list, name: str) -> np.ndarray:
+    # get_all_records 는 '0' 을 int 0 으로 주므로 `or ""` 로 비우면 안 됨
+    return np.array([("" if r.get(name) is None else str(r.get(name))).strip() for r in records], dtype=object)
+
+def build_columns(records: list) -> dict:
+    """레코드 목록 → {이름: 배열} (데이터 버전당 한 번)"""
+    expire = _strings(records, "회원 만료일")
+    dates = np.full(len(records), np.datetime64("NaT"), dtype="datetime64[D]")
+    valid = np.array([len(e) == 10 for e in expire], dtype=bool)
+    if valid.any():
+        dates[valid] = parse_dates(expire[valid].astype(str))
+    tickets = _strings(records, "남은 이용 횟수")
+    return {
+        "plate": _strings(records, "차량번호"),
+        "phone": _strings(records, "전화번호"),
+        "fixed": _strings(records, "상품 옵션(정액제)"),
+        "ticket": _strings(records, "상품 옵션(회수제)"),
+        "expire": dates,
+        "tickets": np.array([to_int(t, -1) if t else -1 for t in tickets], dtype=np.int64),
+        "rereg": np.array([to_int(r.get("재등록 횟수"), 0) for r in records], dtype=np.int64),
+        "rereg_type": _strings(records, "최근 재등록 유형"),
+        "legacy": ",".join(str(r.get("방문기록") or "") for r in records),
+    }
+
+
+def visit_matrix(visit_counts: dict, legacy: str, today, days: int = 28):
+    """
+    최근 days 일의 일별 방문 수 → (날짜 배열, [days × VISIT_GROUPS] 행렬).
+    visit_counts 는 이벤트 {(날짜, 유형): 수}, legacy 는 모든 고객의 L열을 이어 붙인 문자열.
+    """
+    end = np.datetime64(today, "D")
+    start = end - (days - 1)
+    # 'YYYY-MM-DD' 는 문자열 비교로 기간 밖 항목을 먼저 버린다 (대부분의 L열 기록)
+    first, last = str(start), str(end)
+    entries = [(day, kind, n) for (day, kind), n in visit_counts.items() if first <= day <= last]
+    entries += [(day, kind, 1) for day, kind in _LEGACY_DAY.findall(legacy) if first <= day <= last]
+    matrix = np.zeros((days, len(VISIT_GROUPS)), dtype=np.int64)
+    if entries:
+        day = parse_dates(np.array([e[0] for e in entries], dtype=object).astype(str))
+        group = np.array([_GROUP.get(e[1], -1) for e in entries], dtype=np.int64)
+        count = np.array([e[2] for e in entries], dtype=np.int64)
+        keep = ~np.isnat(day) & (day >= start) & (day <= end) & (group >= 0)
+        np.add.at(matrix, ((day[keep] - start).astype(np.int64), group[keep]), count[keep])
+    return start + np.arange(days), matrix
+
+def weekly(dates: np.ndarray, matrix: np.ndarray):
+    """일별 → 주별(월요일 시작) 합계"""
+    # 1970-01-01 은 목요일 → 월요일 기준 요일 = (일수 + 3) % 7
+    offset = (dates.astype(np.int64) + 3) % 7
+    weeks, inverse = np.unique(dates - offset, return_inverse=True)
+    out = np.zeros((len(weeks), matrix.shape[1]), dtype=np.int64)
+    np.add.at(out, inverse, matrix)
+    return weeks, out
+
+def reregistered(cols: dict, kind: str) -> np.ndarray:
+    """
+    kind('정액제'/'회수제') 상품을 재등록한 고객 여부.
+    시트에는 재등록 횟수 합계와 최근 재등록 유형만 있으므로, 두 상품을 다 쓰는 고객은 최근에 재등록한 상품에만 센다
+    (유형이 빈 예전 행은 다른 상품이 없을 때만).
+    """
+    other = cols["ticket"] if kind == "정액제" else cols["fixed"]
+    rtype = cols["rereg_type"]
+    return (cols["rereg"] > 0) & ((rtype == kind) | ((rtype == "") & (other == "")))
+
+def rereg_rates(plans: np.ndarray, again: np.ndarray) -> list:
+    """상품별 [(상품, 고객 수, 재등록 고객 수, 재등록률)] (고객 수 많은 순). again 은 reregistered() 결과"""
+    has = plans != ""
+    if not has.any():
+        return []
+    names, inverse = np.unique(plans[has].astype(str), return_inverse=True)
+    total = np.bincount(inverse, minlength=len(names))
+    again = np.bincount(inverse, weights=again[has], minlength=len(names)).astype(np.int64)
+    order = np.argsort(-total, kind="stable")
+    return [(str(names[i]), int(total[i]), int(again[i]), float(again[i] / total[i])) for i in order]
+
+def expiring(cols: dict, today, days: int = 7) -> list:
+    """정액제 만료가 오늘 ~ days 일 안인 고객 (만료일 순)"""
+    now = np.datetime64(today, "D")
+    mask = (cols["fixed"] != "") & ~np.isnat(cols["expire"]) & (cols["expire"] >= now) & (cols["expire"] <= now + days)
+    idx = np.flatnonzero(mask)
+    idx = idx[np.argsort(cols["expire"][idx], kind="stable")]
+    return [
+        {
+            "차량번호": cols["plate"][i],
+            "전화번호": cols["phone"][i],
+            "상품": cols["fixed"][i],
+            "만료일": str(cols["expire"][i]),
+            "남은 일수": int((cols["expire"][i] - now).astype(np.int64)),
+        }
+        for i in idx
+    ]
+
+def ticket_distribution(cols: dict) -> np.ndarray:
+    """회수권 고객의 남은 이용 횟수 분포 (index = 횟수, 마지막 칸은 10회 이상)"""
+    mask = (cols["ticket"] != "") & (cols["tickets"] >= 0)
+    return np.bincount(np.minimum(cols["tickets"][mask], TICKET_BUCKETS - 1), minlength=TICKET_BUCKETS)
+
+
+def build_report(records: list, visit_counts: dict, today, days: int = 28) -> dict:
+    """통계 탭에 필요한 값 전부 (결과는 작은 목록/배열이라 캐시하기 쉬움)"""
+    cols = build_columns(records)
+    dates, daily = visit_matrix(visit_counts, cols["legacy"], today, days)
+    weeks, week_counts = weekly(dates, daily)
+    return {
+        "customers": len(records),
+        "dates": [str(d) for d in dates],
+        "daily": daily,
+        "weeks": [str(w) for w in weeks],
+        "weekly": week_counts,
+        "rereg_fixed": rereg_rates(cols["fixed"], reregistered(cols, "정액제")),
+        "rereg_ticket": rereg_rates(cols["ticket"], reregistered(cols, "회수제")),
+        "expiring": expiring(cols, today),
+        "tickets": ticket_distribution(cols),
+    }
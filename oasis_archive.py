@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""oasis_archive.py - 오래 방문하지 않은 고객을 '보관고객' 시트로 일괄 이동
+
+고객 시트에는 최근 고객만 남겨 전체 로딩·검색 비용을 줄인다.
+보관된 고객은 조회 시 보관 시트에서 찾고, 다시 기록하면 고객 시트로 되돌아간다.
+
+    python oasis_archive.py --months 6            # 6개월(180일) 넘게 활동 없는 고객 이동
+    python oasis_archive.py --months 6 --dry-run  # 옮길 행 수만 출력
+"""
+
+import argparse
+from datetime import datetime, timedelta
+
+import pytz
+
+from oasis_index import plate_key
+from oasis_sheet import COLUMNS, load_secrets, open_spreadsheet, row_to_record
+from oasis_visits import parse_legacy_log
+
+ARCHIVE_SHEET = "보관고객"
+
+
+def ensure_archive_worksheet(spreadsheet):
+    """'보관고객' 시트를 열고, 없으면 고객 시트와 같은 헤더로 새로 만든다."""
+    for ws in spreadsheet.worksheets():
+        if ws.title == ARCHIVE_SHEET:
+            return ws
+    ws = spreadsheet.add_worksheet(title=ARCHIVE_SHEET, rows=1, cols=len(COLUMNS))
+    ws.append_row(COLUMNS)
+    return ws
+
+def last_activity(record: dict) -> str:
+    """등록일 / 최종 방문일 / 최근 재등록일 / L열 기록 중 가장 늦은 날짜 'YYYY-MM-DD' (없으면 '')"""
+    dates = [str(record.get(c) or "")[:10] for c in ("등록일", "최종 방문일", "최근 재등록일")]
+    dates += [t[:10] for t in parse_legacy_log(record.get("방문기록", ""))]
+    return max(dates, default="")
+
+def inactive_rows(records: list, cutoff: str, today: str) -> list:
+    """cutoff 이후 활동이 없고 정액제도 끝난 고객의 row_idx 목록 (2행부터)"""
+    rows = []
+    for i, r in enumerate(records):
+        if not plate_key(r.get("차량번호")):
+            continue
+        if str(r.get("회원 만료일") or "") >= today:
+            continue  # 아직 유효한 정액제
+        if last_activity(r) < cutoff:
+            rows.append(i + 2)
+    return rows
+
+def delete_requests(sheet_id, rows) -> list:
+    """행 번호 목록 → 연속 구간별 deleteDimension 요청 (아래 행부터 지워야 위 행 번호가 안 밀림)"""
+    runs = []
+    for r in sorted(set(rows), reverse=True):
+        if runs and runs[-1][0] == r + 1:
+            runs[-1][0] = r
+        else:
+            runs.append([r, r])
+    return [
+        {"deleteDimension": {"range": {
+            "sheetId": sheet_id, "dimension": "ROWS", "startIndex": start - 1, "endIndex": end,
+        }}}
+        for start, end in runs
+    ]
+
+
+def archive_inactive(spreadsheet, worksheet, archive_worksheet, months: int, today: str, dry_run: bool = False) -> int:
+    """
+    고객 시트 읽기 1회 + 보관 시트 읽기 1회 → 보관 시트 append_rows 1회
+    → 두 시트의 행 삭제를 스프레드시트 batch_update 1회로 처리. 옮긴 행 수 반환.
+    보관 시트에 남아 있던 '되돌린 고객'의 옛 행도 이때 함께 지운다.
+    """
+    cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=30 * months)).strftime("%Y-%m-%d")
+    values = worksheet.get_all_values()[1:]
+    records = [row_to_record(v) for v in values]
+    move = inactive_rows(records, cutoff, today)
+    if dry_run:
+        return len(move)
+
+    # 보관 시트의 옛 사본: 고객 시트로 되돌아간 고객 + 이번에 새 값으로 다시 옮길 고객
+    hot = {plate_key(r["차량번호"]) for r in records}
+    archived = archive_worksheet.col_values(1)
+    stale = [i for i, p in enumerate(archived[1:], start=2) if plate_key(p) in hot]
+    if not move and not stale:
+        return 0
+
+    # 먼저 보관 시트에 붙이고 지운다 (중간에 실패해도 고객이 사라지지 않음)
+    # 읽은 표시 문자열을 그대로 옮김 (USER_ENTERED 면 '010...' 전화번호가 숫자로 바뀜)
+    if move:
+        width = len(COLUMNS)
+        archive_worksheet.append_rows(
+            [(list(values[r - 2]) + [""] * width)[:width] for r in move], value_input_option="RAW"
+        )
+    spreadsheet.batch_update({
+        "requests": delete_requests(worksheet.id, move) + delete_requests(archive_worksheet.id, stale)
+    })
+    return len(move)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="오래 활동 없는 고객을 보관 시트로 이동")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="서비스 계정이 든 secrets.toml 경로")
+    parser.add_argument("--months", type=int, default=6, help="이 개월 수(30일 단위) 넘게 활동이 없으면 보관")
+    parser.add_argument("--dry-run", action="store_true", help="시트를 바꾸지 않고 옮길 행 수만 출력")
+    args = parser.parse_args(argv)
+
+    today = datetime.now(pytz.timezone("Asia/Seoul")).strftime("%Y-%m-%d")
+    spreadsheet = open_spreadsheet(load_secrets(args.secrets))
+    n = archive_inactive(
+        spreadsheet, spreadsheet.sheet1, ensure_archive_worksheet(spreadsheet), args.months, today, dry_run=args.dry_run
+    )
+    print(f"{'(dry-run) ' if args.dry_run else ''}보관 시트로 {n}명 이동")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""oasis_bench.py - 시트 API 사용량 벤치마크 (메모리 가짜 gspread + 합성 고객 시트)
+
+oasis.py 의 각 화면 동작(검색/조회/방문/재등록/충전/메모/신규등록/일수 재계산)을
+같은 Storage 호출 순서로 재현해, 동작별 시트 호출 수·주고받은 바이트·소요 시간을 잰다.
+
+    python oasis_bench.py                              # 1k / 10k / 100k 행
+    python oasis_bench.py --rows 1000 --latency 0.08   # 호출당 80ms 지연
+    python oasis_bench.py --quota-rate 0.2             # 쓰기 호출 20% 를 429 로 실패
+    python oasis_bench.py --backend sqlite
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from oasis_recompute import days_left_changes
+from oasis_sheet import (
+    COLUMNS,
+    col_letter,
+    memo_changes,
+    raw_records,
+    renew_fixed_changes,
+    topup_changes,
+    visit_changes,
+)
+from oasis_storage import SheetsStorage, SQLiteStorage
+from oasis_visits import VISIT_HEADER, ensure_visit_worksheet
+
+
+# -------------------------------------------------------------------
+# 가짜 gspread
+# -------------------------------------------------------------------
+class FakeAPIError(Exception):
+    """gspread.exceptions.APIError 흉내 (code / response.status_code)"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.response = type("Response", (), {"status_code": code})()
+
+
+def _size(obj) -> int:
+    return len(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class Meter:
+    """모든 가짜 API 호출이 지나가는 계측기: 호출 수 / 바이트 / 지연 / 쿼터 오류 주입"""
+
+    WRITE_METHODS = {"batch_update", "append_row", "append_rows", "update", "delete_rows", "spreadsheet_batch_update"}
+
+    def __init__(self, latency: float = 0.0, quota_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.quota_rate = quota_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = Counter()
+            self.sent = 0
+            self.received = 0
+            self.errors = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"calls": Counter(self.calls), "sent": self.sent, "received": self.received, "errors": self.errors}
+
+    def call(self, method: str, payload, fn):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            self.sent += _size(payload)
+            fail = method in self.WRITE_METHODS and self._random.random() < self.quota_rate
+            if fail:
+                self.errors += 1
+        if fail:
+            raise FakeAPIError(429, "Quota exceeded for quota metric 'Write requests'")
+        result = fn()
+        with self._lock:
+            self.received += _size(result)
+        return result
+
+
+_A1 = re.compile(r"^(?:'?[^!]*'?!)?([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$")
+
+_NUMBER = re.compile(r"^-?\d+$")
+
+def _entered(rows: list, value_input_option) -> list:
+    """USER_ENTERED 면 시트처럼 숫자 문자열을 숫자로 ('010...' → 10...), RAW 는 그대로"""
+    if value_input_option != "USER_ENTERED":
+        return rows
+    return [[int(v) if isinstance(v, str) and _NUMBER.match(v) else v for v in row] for row in rows]
+
+def _col_index(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+class FakeCell:
+
+    def __init__(self, row: int, col: int, value):
+        self.row, self.col, self.value = row, col, value
+
+
+class FakeWorksheet:
+
+    def __init__(self, meter: Meter, title: str, values: list, sheet_id: int = 0):
+        self.meter = meter
+        self.title = title
+        self.id = sheet_id
+        self._values = values  # 헤더 포함 2차원 리스트
+        self._lock = threading.Lock()
+
+    # --- 내부 ---
+
+    def _range(self, a1: str):
+        m = _A1.match(a1)
+        c1, r1, c2, r2 = m.group(1), m.group(2), m.group(3), m.group(4)
+        c1 = _col_index(c1)
+        c2 = _col_index(c2) if c2 else c1
+        r1 = int(r1) if r1 else 1
+        r2 = int(r2) if r2 else (len(self._values) if m.group(3) else r1)
+        return r1, c1, r2, c2
+
+    def _read(self, a1: str) -> list:
+        r1, c1, r2, c2 = self._range(a1)
+        out = []
+        for row in self._values[r1 - 1:r2]:
+            cells = [str(v) for v in row[c1 - 1:c2]]
+            while cells and cells[-1] == "":
+                cells.pop()
+            out.append(cells)
+        while out and not out[-1]:
+            out.pop()
+        return out
+
+    def _write(self, a1: str, values: list):
+        r1, c1, _, _ = self._range(a1)
+        for dr, row in enumerate(values):
+            r = r1 + dr
+            while len(self._values) < r:
+                self._values.append([])
+            target = self._values[r - 1]
+            for dc, v in enumerate(row):
+                c = c1 + dc
+                while len(target) < c:
+                    target.append("")
+                target[c - 1] = v
+
+    def _append(self, rows: list) -> dict:
+        start = len(self._values) + 1
+        self._values.extend(list(r) for r in rows)
+        end = len(self._values)
+        width = max((len(r) for r in rows), default=1)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{col_letter(width)}{end}"}}
+
+    # --- gspread 와 같은 이름의 API ---
+
+    def get_all_values(self):
+        def fn():
+            with self._lock:
+                return [[str(v) for v in row] for row in self._values]
+        return self.meter.call("get_all_values", self.title, fn)
+
+    def get_all_records(self):
+        def fn():
+            with self._lock:
+                header = [str(h) for h in self._values[0]] if self._values else []
+                records = []
+                for row in self._values[1:]:
+                    cells = list(row) + [""] * (len(header) - len(row))
+                    # gspread 처럼 숫자 문자열은 int 로
+                    records.append({h: (int(v) if str(v).isdigit() else v) for h, v in zip(header, cells)})
+                return records
+        return self.meter.call("get_all_records", self.title, fn)
+
+    def get(self, a1: str):
+        def fn():
+            with self._lock:
+                return self._read(a1)
+        return self.meter.call("get", a1, fn)
+
+    def batch_get(self, ranges: list):
+        def fn():
+            with self._lock:
+                return [self._read(a1) for a1 in ranges]
+        return self.meter.call("batch_get", ranges, fn)
+
+    def row_values(self, row: int):
+        def fn():
+            with self._lock:
+                return [str(v) for v in self._values[row - 1]] if row <= len(self._values) else []
+        return self.meter.call("row_values", row, fn)
+
+    def col_values(self, col: int):
+        def fn():
+            with self._lock:
+                return [str(row[col - 1]) if len(row) >= col else "" for row in self._values]
+        return self.meter.call("col_values", col, fn)
+
+    def batch_update(self, data: list, value_input_option=None):
+        def fn():
+            with self._lock:
+                for item in data:
+                    self._write(item["range"], _entered(item["values"], value_input_option))
+                return {"totalUpdatedCells": sum(len(r) for item in data for r in item["values"])}
+        return self.meter.call("batch_update", data, fn)
+
+    def update(self, a1: str, values: list, value_input_option=None):
+        def fn():
+            with self._lock:
+                self._write(a1, _entered(values, value_input_option))
+                return {"updatedRange": a1}
+        return self.meter.call("update", [a1, values], fn)
+
+    def append_row(self, row: list, value_input_option=None):
+        def fn():
+            with self._lock:
+                return self._append(_entered([row], value_input_option))
+        return self.meter.call("append_row", row, fn)
+
+    def append_rows(self, rows: list, value_input_option=None):
+        def fn():
+            with self._lock:
+                return self._append(_entered(rows, value_input_option))
+        return self.meter.call("append_rows", rows, fn)
+
+    def delete_rows(self, start: int, end: int = None):
+        def fn():
+            with self._lock:
+                del self._values[start - 1:(end or start)]
+                return {}
+        return self.meter.call("delete_rows", [start, end], fn)
+
+    def find(self, query: str, in_column: int = None):
+        """gspread 5+ 처럼 못 찾으면 None"""
+        def fn():
+            with self._lock:
+                for r, row in enumerate(self._values, start=1):
+                    cols = [in_column] if in_column else range(1, len(row) + 1)
+                    for c in cols:
+                        if len(row) >= c and str(row[c - 1]) == query:
+                            return FakeCell(r, c, query)
+                return None
+        return self.meter.call("find", query, fn)
+
+
+class FakeSpreadsheet:
+
+    def __init__(self, meter: Meter, sheets: dict):
+        self.meter = meter
+        self._sheets = {
+            title: FakeWorksheet(meter, title, values, sheet_id=i) for i, (title, values) in enumerate(sheets.items())
+        }
+
+    @property
+    def sheet1(self):
+        return self.meter.call("fetch_sheet_metadata", "sheet1", lambda: next(iter(self._sheets.values())))
+
+    def worksheets(self):
+        return self.meter.call("fetch_sheet_metadata", "worksheets", lambda: list(self._sheets.values()))
+
+    def worksheet(self, title: str):
+        return self.meter.call("fetch_sheet_metadata", title, lambda: self._sheets[title])
+
+    def add_worksheet(self, title: str, rows: int = 1, cols: int = 1):
+        def fn():
+            self._sheets[title] = FakeWorksheet(self.meter, title, [], sheet_id=len(self._sheets))
+            return self._sheets[title]
+        return self.meter.call("spreadsheet_batch_update", ["addSheet", title], fn)
+
+    def batch_update(self, body: dict):
+        """deleteDimension(ROWS) 만 흉내"""
+        def fn():
+            by_id = {ws.id: ws for ws in self._sheets.values()}
+            for request in body.get("requests", []):
+                r = request["deleteDimension"]["range"]
+                ws = by_id[r["sheetId"]]
+                with ws._lock:
+                    del ws._values[r["startIndex"]:r["endIndex"]]
+            return {}
+        return self.meter.call("spreadsheet_batch_update", body, fn)
+
+
+class FakeClient:
+    """gspread.Client 흉내: open(제목) 은 Drive 검색 + 메타데이터, open_by_key 는 메타데이터만"""
+
+    def __init__(self, spreadsheet: FakeSpreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open(self, title: str):
+        self.spreadsheet.meter.call("drive_files_list", title, lambda: None)
+        return self.open_by_key(title)
+
+    def open_by_key(self, key: str):
+        return self.spreadsheet.meter.call("fetch_sheet_metadata", key, lambda: self.spreadsheet)
+
+
+# -------------------------------------------------------------------
+# 합성 고객 시트
+# -------------------------------------------------------------------
+_HANGUL = "가나다라마거너더러머버서어저고노도로모보소오조구누두루무부수우주하허호"
+정액제옵션 = ["기본(정액제)", "중급(정액제)", "고급(정액제)"]
+회수제옵션 = ["일반 5회권", "중급 5회권", "고급 5회권", "일반 10회권", "중급 10회권", "고급 10회권", "고급 1회권"]
+
+
+def make_plate(rng: random.Random) -> str:
+    return f"{rng.randint(10, 399)}{rng.choice(_HANGUL)} {rng.randint(1000, 9999)}"
+
+def synthetic_sheet(n: int, visits_per_customer: float = 2.0, seed: int = 0, today=None):
+    """→ (고객 시트 값, 방문기록 시트 값, 차량번호 목록)"""
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    plates = set()
+    while len(plates) < n:
+        plates.add(make_plate(rng))
+    plates = sorted(plates, key=lambda _: rng.random())
+
+    customers = [list(COLUMNS)]
+    visits = [list(VISIT_HEADER)]
+    for plate in plates:
+        registered = today - timedelta(days=rng.randint(0, 720))
+        jung = rng.choice(정액제옵션) if rng.random() < 0.35 else ""
+        hue = rng.choice(회수제옵션) if rng.random() < 0.5 else ""
+        expire = (today + timedelta(days=rng.randint(-60, 30))).strftime("%Y-%m-%d") if jung else ""
+        legacy = ", ".join(
+            f"{(registered + timedelta(days=d)).strftime('%Y-%m-%d %H:%M')} (정액제)"
+            for d in sorted(rng.sample(range(0, 60), rng.randint(0, 5)))
+        )
+        customers.append([
+            plate, f"010{rng.randint(10000000, 99999999)}", registered.strftime("%Y-%m-%d"),
+            registered.strftime("%Y-%m-%d"), rng.randint(1, 80), jung, rng.randint(0, 30) if jung else "",
+            hue, rng.randint(0, 10) if hue else "", expire, "Y" if rng.random() < 0.01 else "",
+            legacy, "", "", "", "", "",
+        ])
+        for _ in range(int(visits_per_customer) + (rng.random() < visits_per_customer % 1)):
+            when = today - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 600))
+            visits.append([plate, when.strftime("%Y-%m-%d %H:%M"), rng.choice(["정액제", "회수제"])])
+    visits[1:] = sorted(visits[1:], key=lambda r: r[1])
+    return customers, visits, plates
+
+
+# -------------------------------------------------------------------
+# 화면 동작 (oasis.py 와 같은 Storage 호출 순서)
+# -------------------------------------------------------------------
+def _now():
+    now = datetime.now()
+    return now, now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d %H:%M")
+
+def flow_search(storage, plate, rng):
+    storage.search(plate[-4:])
+
+def flow_lookup(storage, plate, rng):
+    customer = storage.get(plate)
+    storage.visit_summary(customer, None)
+
+def flow_visit(storage, plate, rng):
+    now, today, now_str = _now()
+    storage.get(plate)  # 화면처럼 카드를 먼저 읽음
+    storage.update(plate, visit_changes("정액제", today))
+    storage.append_visit(plate, now_str, "정액제")
+
+def flow_renewal(storage, plate, rng):
+    now, today, now_str = _now()
+    storage.get(plate)  # 화면처럼 카드를 먼저 읽음
+    storage.update(plate, renew_fixed_changes(정액제옵션[0], now, now_str, today))
+    storage.append_visit(plate, now_str, "재등록")
+
+def flow_topup(storage, plate, rng):
+    now, today, now_str = _now()
+    storage.update(plate, topup_changes(회수제옵션[3], now_str))
+
+def flow_memo(storage, plate, rng):
+    storage.update(plate, memo_changes(f"벤치 메모 {rng.randint(0, 9999)}"))
+
+def flow_register(storage, plate, rng):
+    now, today, now_str = _now()
+    new_plate = make_plate(rng)
+    while storage.exists(new_plate):
+        new_plate = make_plate(rng)
+    storage.append_customer([new_plate, "01012345678", today, today, 1, "", "", 회수제옵션[0], 5, "", "", ""])
+    storage.append_visit(new_plate, now_str, "신규등록")
+
+def flow_recompute(storage, plate, rng):
+    storage.update_many(days_left_changes(storage.load(), datetime.now().strftime("%Y-%m-%d")))
+
+FLOWS = [
+    ("검색(끝 4자리)", flow_search),
+    ("고객 조회", flow_lookup),
+    ("방문 기록", flow_visit),
+    ("정액제 재등록", flow_renewal),
+    ("회수권 충전", flow_topup),
+    ("메모 저장", flow_memo),
+    ("신규 등록", flow_register),
+    ("일수 일괄 재계산", flow_recompute),
+]
+
+
+# -------------------------------------------------------------------
+# 실행
+# -------------------------------------------------------------------
+def _flush(storage, worksheet, visit_worksheet):
+    if isinstance(storage, SheetsStorage):
+        storage.queue.flush(timeout=600)
+    else:
+        # 백그라운드 동기화 1주기를 바로 실행 (429 는 다시 시도)
+        while True:
+            try:
+                storage.sync_to_sheet(worksheet)
+                storage.sync_visits(visit_worksheet)
+                return
+            except FakeAPIError:
+                time.sleep(0.01)
+
+
+def build(n: int, backend: str, meter: Meter, visits_per_customer: float, seed: int, workdir: str):
+    customers, visits, plates = synthetic_sheet(n, visits_per_customer, seed)
+    client = FakeClient(FakeSpreadsheet(meter, {"Sheet1": customers, "방문기록": visits}))
+
+    # oasis.py 의 cache_resource 핸들과 동일하게 프로세스당 한 번만 연다
+    spreadsheet = client.open_by_key("bench")
+    worksheet = spreadsheet.sheet1
+    visit_worksheet = ensure_visit_worksheet(spreadsheet)
+
+    if backend == "sqlite":
+        storage = SQLiteStorage(os.path.join(workdir, f"bench_{n}.db"))
+        storage.import_records(raw_records(worksheet))
+        storage.import_visits(visit_worksheet.get_all_values()[1:])
+    else:
+        storage = SheetsStorage(lambda: worksheet, lambda: visit_worksheet, ttl=3600)
+        storage.queue.base_delay = 0.01
+        storage.queue.max_retries = 50
+        storage.load()
+        storage.visit_summary({"차량번호": plates[0]})
+    return storage, worksheet, visit_worksheet, plates
+
+
+def run(n: int, backend: str, repeat: int, latency: float, quota_rate: float, visits_per_customer: float, seed: int):
+    meter = Meter(latency=latency, quota_rate=0.0, seed=seed)
+    rng = random.Random(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        t0 = time.perf_counter()
+        storage, worksheet, visit_worksheet, plates = build(n, backend, meter, visits_per_customer, seed, workdir)
+        startup = meter.snapshot()
+        results.append(("시작(열기+전체 로딩)", 1, startup, (time.perf_counter() - t0) * 1000, 0.0))
+
+        meter.quota_rate = quota_rate
+        for name, flow in FLOWS:
+            meter.reset()
+            ui = total = 0.0
+            runs = 1 if flow is flow_recompute else repeat
+            for _ in range(runs):
+                plate = rng.choice(plates)
+                t0 = time.perf_counter()
+                flow(storage, plate, rng)
+                t1 = time.perf_counter()
+                _flush(storage, worksheet, visit_worksheet)
+                ui += t1 - t0
+                total += time.perf_counter() - t0
+            results.append((name, runs, meter.snapshot(), ui * 1000 / runs, total * 1000 / runs))
+    return results
+
+
+def report(n: int, backend: str, results: list):
+    print(f"\n=== {n:,}행 · {backend} ===")
+    print(f"{'동작':<16}{'호출/회':>9}{'보냄KB/회':>11}{'받음KB/회':>11}{'429':>5}{'화면ms':>9}{'반영포함ms':>12}  호출 내역")
+    for name, runs, snap, ui_ms, total_ms in results:
+        calls = sum(snap["calls"].values())
+        detail = ", ".join(f"{m}×{c / runs:g}" for m, c in snap["calls"].most_common())
+        print(
+            f"{name:<16}{calls / runs:>9.2f}{snap['sent'] / runs / 1024:>11.1f}{snap['received'] / runs / 1024:>11.1f}"
+            f"{snap['errors']:>5}{ui_ms:>9.1f}{total_ms:>12.1f}  {detail}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="동작별 시트 API 호출/바이트/시간 벤치마크")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--backend", choices=["sheets", "sqlite"], default="sheets")
+    parser.add_argument("--repeat", type=int, default=20, help="동작별 반복 횟수")
+    parser.add_argument("--latency", type=float, default=0.0, help="가짜 API 호출당 지연(초)")
+    parser.add_argument("--quota-rate", type=float, default=0.0, help="쓰기 호출을 429 로 실패시킬 확률")
+    parser.add_argument("--visits-per-customer", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for n in args.rows:
+        results = run(n, args.backend, args.repeat, args.latency, args.quota_rate, args.visits_per_customer, args.seed)
+        report(n, args.backend, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""oasis_bulk.py - 고객 CSV 일괄 가져오기 / 내보내기 (청크 append_rows + 범위 나눠 읽기)
+
+등록 화면처럼 한 대씩 append_row 하지 않고, CSV 를 청크 단위로 읽어 검증·정리한 뒤
+append_rows 1회에 chunk 행씩 보낸다. 분당 호출 수를 제한하고 429/5xx 는 기다렸다 다시 보낸다.
+가져오기 전에 차량번호 열을 한 번 읽어(보관 시트 포함) 이미 있는 차량은 건너뛰므로,
+중간에 끊겨도 같은 명령을 다시 실행하면 남은 행만 들어간다.
+
+    python oasis_bulk.py import customers.csv             # 중복 제외하고 추가
+    python oasis_bulk.py import customers.csv --dry-run   # 추가될 / 건너뛸 행 수만 출력
+    python oasis_bulk.py export backup.csv --archive      # 고객 시트 + 보관 시트 백업
+"""
+
+import argparse
+import csv
+import random
+import time
+from datetime import datetime
+from itertools import islice
+
+import pytz
+
+from oasis_archive import ARCHIVE_SHEET
+from oasis_index import plate_key
+from oasis_metrics import QUOTA_PER_MINUTE
+from oasis_queue import is_retryable
+from oasis_sheet import COLUMNS, col_letter, load_secrets, open_spreadsheet
+
+CHUNK_ROWS = 1000   # append_rows 1회당 행 수
+PAGE_ROWS = 5000    # 내보내기 범위 읽기 1회당 행 수
+MAX_RETRIES = 6
+
+
+class RateLimiter:
+    """분당 per_minute 회를 넘지 않도록 호출 사이 간격을 벌린다 (CLI 한 프로세스용)"""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def call_sheet(limiter: RateLimiter, fn, max_retries: int = MAX_RETRIES):
+    """limiter 간격을 지켜 fn() 호출. 429/5xx/네트워크 오류는 지수 백오프로 다시 시도"""
+    attempt = 0
+    while True:
+        limiter.wait()
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if not is_retryable(e) or attempt > max_retries:
+                raise
+            delay = min(2 ** attempt, 64)
+            print(f"  시트 오류 {type(e).__name__}: {e} → {delay}초 후 다시 시도 ({attempt}/{max_retries})")
+            time.sleep(delay + random.uniform(0, delay / 4))
+
+
+def normalize_row(record: dict, today: str):
+    """
+    CSV 1행(dict) → (시트 1행, None) 또는 (None, 오류 사유).
+    등록 화면과 같은 규칙: 차량번호·전화번호 필수, 전화번호는 '-' 제거.
+    """
+    plate = plate_key(record.get("차량번호"))
+    phone = str(record.get("전화번호") or "").replace("-", "").strip()
+    if not plate:
+        return None, "차량번호 없음"
+    if not phone:
+        return None, "전화번호 없음"
+    row = [str(record.get(c) or "").strip() for c in COLUMNS]
+    row[0], row[1] = plate, phone
+    if not row[2]:
+        row[2] = today  # 등록일
+    return row, None
+
+def existing_plates(spreadsheet, worksheet, limiter: RateLimiter) -> set:
+    """고객 시트 + (있으면) 보관 시트의 차량번호 열 → 중복 검사용 색인 (열 읽기 1~2회)"""
+    sheets = [worksheet] + [ws for ws in spreadsheet.worksheets() if ws.title == ARCHIVE_SHEET]
+    plates = set()
+    for ws in sheets:
+        plates.update(plate_key(p) for p in call_sheet(limiter, lambda: ws.col_values(1))[1:])
+    plates.discard("")
+    return plates
+
+
+def import_csv(spreadsheet, worksheet, path: str, today: str, chunk: int = CHUNK_ROWS,
+               per_minute: float = QUOTA_PER_MINUTE * 0.8, dry_run: bool = False) -> dict:
+    """CSV → 고객 시트 끝에 append_rows (chunk 행씩). 추가/중복/오류 행 수 반환"""
+    limiter = RateLimiter(per_minute)
+    seen = existing_plates(spreadsheet, worksheet, limiter)
+    result = {"added": 0, "duplicate": 0, "invalid": 0, "errors": []}
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if "차량번호" not in (reader.fieldnames or []):
+            raise ValueError(f"CSV 헤더에 '차량번호' 열이 없습니다: {reader.fieldnames}")
+        line = 1
+        while True:
+            batch = list(islice(reader, chunk))
+            if not batch:
+                break
+            rows = []
+            for record in batch:
+                line += 1
+                row, error = normalize_row(record, today)
+                if error:
+                    result["invalid"] += 1
+                    if len(result["errors"]) < 20:
+                        result["errors"].append(f"{line}행: {error}")
+                    continue
+                # 같은 CSV 안의 중복도 첫 행만
+                if row[0] in seen:
+                    result["duplicate"] += 1
+                    continue
+                seen.add(row[0])
+                rows.append(row)
+            if rows and not dry_run:
+                # RAW: USER_ENTERED 면 전화번호 앞자리 0 이 숫자로 바뀌어 사라진다 (등록·보관 이동과 같은 방식)
+                call_sheet(limiter, lambda: worksheet.append_rows(rows, value_input_option="RAW"))
+                print(f"  {result['added'] + len(rows)}행 추가")
+            result["added"] += len(rows)
+    return result
+
+def export_csv(worksheets: list, path: str, page: int = PAGE_ROWS,
+               per_minute: float = QUOTA_PER_MINUTE * 0.8) -> int:
+    """시트들 → CSV (헤더 1행 + 차량번호 있는 행). get('A{start}:R{end}') 로 page 행씩 읽음"""
+    limiter = RateLimiter(per_minute)
+    width = len(COLUMNS)
+    last_col = col_letter(width)
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for ws in worksheets:
+            start = 2
+            while True:
+                a1 = f"A{start}:{last_col}{start + page - 1}"
+                values = call_sheet(limiter, lambda: ws.get(a1))
+                rows = [(list(v) + [""] * width)[:width] for v in values if v and plate_key(v[0])]
+                writer.writerows(rows)
+                written += len(rows)
+                # 빈 끝 행은 응답에서 빠지므로 한 페이지를 못 채우면 마지막
+                if len(values) < page:
+                    break
+                start += page
+            print(f"  {ws.title}: 누적 {written}행")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="고객 CSV 일괄 가져오기 / 내보내기")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="서비스 계정이 든 secrets.toml 경로")
+    parser.add_argument("--rate", type=float, default=QUOTA_PER_MINUTE * 0.8, help="분당 최대 시트 호출 수")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="CSV 고객을 고객 시트에 추가 (이미 있는 차량번호는 건너뜀)")
+    p_import.add_argument("csv", help="헤더에 시트와 같은 열 이름(최소 차량번호, 전화번호)이 있는 CSV")
+    p_import.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="append_rows 1회당 행 수")
+    p_import.add_argument("--dry-run", action="store_true", help="시트에 쓰지 않고 추가될 행 수만 출력")
+
+    p_export = sub.add_parser("export", help="고객 시트를 CSV 로 저장")
+    p_export.add_argument("csv", help="저장할 CSV 경로")
+    p_export.add_argument("--page", type=int, default=PAGE_ROWS, help="범위 읽기 1회당 행 수")
+    p_export.add_argument("--archive", action="store_true", help="보관 시트 고객도 함께 저장")
+    args = parser.parse_args(argv)
+
+    spreadsheet = open_spreadsheet(load_secrets(args.secrets))
+    started = time.perf_counter()
+    if args.command == "import":
+        today = datetime.now(pytz.timezone("Asia/Seoul")).strftime("%Y-%m-%d")
+        result = import_csv(
+            spreadsheet, spreadsheet.sheet1, args.csv, today,
+            chunk=args.chunk, per_minute=args.rate, dry_run=args.dry_run,
+        )
+        for error in result["errors"]:
+            print(f"  건너뜀 {error}")
+        print(
+            f"{'(dry-run) ' if args.dry_run else ''}추가 {result['added']}행 · 중복 {result['duplicate']}행"
+            f" · 오류 {result['invalid']}행 ({time.perf_counter() - started:.0f}초)"
+        )
+    else:
+        worksheets = [spreadsheet.sheet1]
+        if args.archive:
+            worksheets += [ws for ws in spreadsheet.worksheets() if ws.title == ARCHIVE_SHEET]
+        n = export_csv(worksheets, args.csv, page=args.page, per_minute=args.rate)
+        print(f"{n}행 저장 → {args.csv} ({time.perf_counter() - started:.0f}초)")
+
+
+if __name__ == "__main__":
+    main()
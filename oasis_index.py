@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""oasis_index.py - 차량번호 색인 (정확 일치 + 끝 4자리 + 2-gram)"""
+
+from collections import defaultdict
+
+
+def plate_key(plate) -> str:
+    return str(plate or "").strip()
+
+def digit_suffix(plate: str, n: int = 4) -> str:
+    digits = "".join(ch for ch in plate if ch.isdigit())
+    return digits[-n:] if len(digits) >= n else ""
+
+def _bigrams(text: str) -> set:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def _digit_runs(text: str) -> set:
+    """연속된 숫자 4자리 조각 전부 ('1234가 5678' → {'1234', '5678'})"""
+    return {text[i:i + 4] for i in range(len(text) - 3) if text[i:i + 4].isdigit()}
+
+
+class PlateIndex:
+    """
+    데이터 로딩 1회당 한 번 만드는 차량번호 색인.
+      - by_plate  : 차량번호 → row_idx (정확 일치)
+      - by_suffix : 끝 4자리 숫자 → [row_idx]  (번호판 인식 후보)
+      - by_digits : 연속 숫자 4자리 → [row_idx] ("끝 4자리" 등 숫자 4자리 검색)
+      - by_gram   : 2-gram → {row_idx}        (그 외 부분 문자열 검색)
+    row_idx 는 시트 행 번호(2행부터 데이터)이고 레코드는 records[row_idx - 2].
+    """
+
+    def __init__(self, records: list):
+        self.records = records
+        self.by_plate = {}
+        self.by_suffix = defaultdict(list)
+        self.by_digits = defaultdict(list)
+        self.by_gram = defaultdict(set)
+        for i, r in enumerate(records):
+            self.add(r, i + 2)
+
+    def add(self, record: dict, row_idx: int):
+        plate = plate_key(record.get("차량번호"))
+        if not plate:
+            return
+        # 중복 차량번호는 기존 get_customer 처럼 첫 행 우선
+        self.by_plate.setdefault(plate, row_idx)
+        suffix = digit_suffix(plate)
+        if suffix:
+            self.by_suffix[suffix].append(row_idx)
+        for run in _digit_runs(plate):
+            self.by_digits[run].append(row_idx)
+        for g in _bigrams(plate):
+            self.by_gram[g].add(row_idx)
+
+    def get(self, plate):
+        """정확 일치 → (customer, row_idx), 없으면 (None, None)"""
+        row_idx = self.by_plate.get(plate_key(plate))
+        if row_idx is None:
+            return None, None
+        return self.records[row_idx - 2], row_idx
+
+    def __contains__(self, plate) -> bool:
+        return plate_key(plate) in self.by_plate
+
+    def search(self, query: str) -> list:
+        """'전체 또는 끝 4자리' 검색 → 시트 순서대로 row_idx 목록 (기존 `query in 차량번호` 와 동일 결과)"""
+        q = plate_key(query)
+        if not q:
+            return []
+
+        # 숫자 4자리: 그 4자리를 연속으로 포함한 차량번호만 by_digits 에 있음 (끝자리가 아닌 경우도 포함)
+        if q.isdigit() and len(q) == 4:
+            candidates = sorted(self.by_digits.get(q, ()))
+        elif len(q) < 2:
+            candidates = range(2, len(self.records) + 2)
+        else:
+            grams = sorted(_bigrams(q), key=lambda g: len(self.by_gram.get(g, ())))
+            candidates = set(self.by_gram.get(grams[0], ()))
+            for g in grams[1:]:
+                if not candidates:
+                    break
+                candidates &= self.by_gram.get(g, set())
+            candidates = sorted(candidates)
+
+        return [
+            row_idx for row_idx in candidates
+            if q in plate_key(self.records[row_idx - 2].get("차량번호"))
+        ]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""oasis_journal.py - 시트 쓰기 저널 (이 기기의 SQLite 파일) + 마지막 고객 목록 저장본"""
+
+import json
+import sqlite3
+import threading
+import time
+
+from oasis_sheet import Increment
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot (
+    name TEXT PRIMARY KEY,
+    saved_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+def _encode(value):
+    if isinstance(value, Increment):
+        return {"$inc": value.n}
+    return value
+
+def _decode(value):
+    if isinstance(value, dict) and "$inc" in value:
+        return Increment(value["$inc"])
+    return value
+
+def encode_changes(changes: dict) -> dict:
+    return {name: _encode(v) for name, v in changes.items()}
+
+def decode_changes(changes: dict) -> dict:
+    return {name: _decode(v) for name, v in changes.items()}
+
+
+class Journal:
+    """
+    시트에 보낼 쓰기를 먼저 여기에 남기고(수 ms), 시트 반영이 끝나면 지운다.
+    프로세스가 죽거나 시트가 오래 안 될 때도 다음 시작 때 남은 항목을 순서대로 다시 보낸다.
+    시트를 못 읽을 때 보여줄 마지막 고객 목록(snapshot)도 같은 파일에 둔다.
+    """
+
+    def __init__(self, path: str = "oasis_journal.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def add_many(self, kind: str, payloads: list) -> list:
+        """같은 종류 항목 여러 개를 트랜잭션 1번으로 → 항목 id 목록"""
+        now = time.time()
+        ids = []
+        with self._lock, self._conn:
+            for payload in payloads:
+                cur = self._conn.execute(
+                    "INSERT INTO journal (kind, payload, created_at) VALUES (?, ?, ?)",
+                    (kind, json.dumps(payload, ensure_ascii=False), now),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    def pending(self) -> list:
+        """→ [(id, kind, payload)] 들어온 순서대로"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, kind, payload FROM journal ORDER BY id").fetchall()
+        return [(i, kind, json.loads(payload)) for i, kind, payload in rows]
+
+    def remove(self, ids):
+        ids = [i for i in ids if i is not None]
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM journal WHERE id = ?", [(i,) for i in ids])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
+
+    def save_snapshot(self, name: str, data):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshot (name, saved_at, data) VALUES (?, ?, ?)",
+                (name, time.time(), json.dumps(data, ensure_ascii=False)),
+            )
+
+    def load_snapshot(self, name: str):
+        """→ (data, 저장 시각 epoch) 또는 (None, None)"""
+        with self._lock:
+            row = self._conn.execute("SELECT data, saved_at FROM snapshot WHERE name = ?", (name,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, None)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""oasis_metrics.py - 시트 호출 / 캐시 / rerun 계측 (프로세스·세션별 누적, 선택적 JSON 로그)"""
+
+import json
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# 시트 API 분당 한도 (사용자당 읽기/쓰기 각 60회)
+QUOTA_PER_MINUTE = 60
+
+WRITE_METHODS = {
+    "batch_update", "update", "update_cell", "append_row", "append_rows",
+    "delete_rows", "add_worksheet", "insert_rows", "clear",
+}
+
+
+def json_logger(path: str) -> logging.Logger:
+    """계측 이벤트를 한 줄에 JSON 하나씩 남기는 로거 ('-' 이면 표준 에러)"""
+    logger = logging.getLogger("oasis.metrics")
+    if not logger.handlers:
+        handler = logging.StreamHandler() if path == "-" else logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Metrics:
+    """
+    프로세스당 1개. 시트 호출(메서드별 횟수·시간·오류), 최근 60초 호출 수,
+    캐시 적중/미스, rerun 소요 시간을 모은다. 세션별 값은 session dict 에 따로 쌓는다.
+    """
+
+    def __init__(self, window: float = 60.0, max_reruns: int = 500, logger=None):
+        self.window = window
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._recent = deque()  # (시각, 쓰기 여부)
+        self.calls = Counter()
+        self.errors = Counter()
+        self.call_ms = Counter()
+        self.cache = Counter()
+        self._reruns = deque(maxlen=max_reruns)
+        self.started = time.time()
+
+    def _log(self, **event):
+        if self.logger is not None:
+            event["ts"] = round(time.time(), 3)
+            self.logger.info(json.dumps(event, ensure_ascii=False))
+
+    # --- 기록 ---
+
+    def record_call(self, method: str, seconds: float, error: Exception = None):
+        now = time.monotonic()
+        with self._lock:
+            self.calls[method] += 1
+            self.call_ms[method] += seconds * 1000
+            if error is not None:
+                self.errors[method] += 1
+            self._recent.append((now, method in WRITE_METHODS))
+            while self._recent and now - self._recent[0][0] > self.window:
+                self._recent.popleft()
+        self._log(
+            kind="sheets_call", method=method, ms=round(seconds * 1000, 1),
+            error=f"{type(error).__name__}: {error}" if error is not None else None,
+        )
+
+    @contextmanager
+    def timed(self, method: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record_call(method, time.perf_counter() - t0, e)
+            raise
+        self.record_call(method, time.perf_counter() - t0)
+
+    def record_cache(self, name: str, hit: bool, session: dict = None):
+        key = f"{name}:{'hit' if hit else 'miss'}"
+        with self._lock:
+            self.cache[key] += 1
+        if session is not None:
+            session.setdefault("cache", Counter())[key] += 1
+        self._log(kind="cache", name=name, hit=hit)
+
+    def record_rerun(self, seconds: float, session: dict = None):
+        ms = seconds * 1000
+        with self._lock:
+            self._reruns.append(ms)
+        if session is not None:
+            session.setdefault("reruns", deque(maxlen=100)).append(ms)
+        self._log(kind="rerun", ms=round(ms, 1))
+
+    # --- 조회 ---
+
+    def calls_per_minute(self):
+        """→ (최근 1분 읽기 호출 수, 쓰기 호출 수)"""
+        now = time.monotonic()
+        with self._lock:
+            recent = [w for t, w in self._recent if now - t <= 60]
+        writes = sum(recent)
+        return len(recent) - writes, writes
+
+    def rerun_percentiles(self, session: dict = None):
+        """→ (p50 ms, p95 ms), 기록이 없으면 None"""
+        with self._lock:
+            values = list(session.get("reruns", ())) if session is not None else list(self._reruns)
+        return _percentile(values, 0.5), _percentile(values, 0.95)
+
+    @staticmethod
+    def hit_rate(cache: Counter, name: str):
+        hit, miss = cache.get(f"{name}:hit", 0), cache.get(f"{name}:miss", 0)
+        return hit / (hit + miss) if hit + miss else None
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": Counter(self.calls),
+                "errors": Counter(self.errors),
+                "call_ms": Counter(self.call_ms),
+                "cache": Counter(self.cache),
+            }
+
+
+class _Instrumented:
+    """gspread 객체 프록시: 메서드 호출마다 Metrics.timed 로 감쌈"""
+
+    def __init__(self, target, metrics: Metrics):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_metrics", metrics)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        metrics = self._metrics
+
+        def wrapper(*args, **kwargs):
+            with metrics.timed(name):
+                return attr(*args, **kwargs)
+        return wrapper
+
+
+def instrument(target, metrics: Metrics):
+    return _Instrumented(target, metrics)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""oasis_ocr.py - 번호판 사진 → 차량번호 후보 (OpenCV 위치 찾기 + Tesseract + 끝 4자리 색인 대조)"""
+
+import re
+import time
+
+import numpy as np
+
+PLATE_HANGUL = "가나다라마거너더러머버서어저고노도로모보소오조구누두루무부수우주아바사자배하허호"
+_PLATE = re.compile(r"\d{2,3}[가-힣]\d{4}$")
+_NOT_PLATE_CHAR = re.compile(r"[^0-9가-힣]")
+
+
+def plate_text(text) -> str:
+    """OCR/차량번호 문자열 → 숫자·한글만 (공백, 테두리 잡음 제거)"""
+    return _NOT_PLATE_CHAR.sub("", str(text or ""))
+
+def edit_distance(a: str, b: str) -> int:
+    """레벤슈타인 거리 (번호판 길이라 단순 DP 로 충분)"""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        cur = [i]
+        for j, cb in enumerate(b, start=1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+def suffix_variants(digits: str) -> list:
+    """읽은 숫자의 끝 4자리 + 한 글자만 잘못 읽었을 경우(36가지). 4자리 미만이면 []"""
+    if len(digits) < 4:
+        return []
+    suffix = digits[-4:]
+    variants = [suffix]
+    for i, ch in enumerate(suffix):
+        for d in "0123456789":
+            if d != ch:
+                variants.append(suffix[:i] + d + suffix[i + 1:])
+    return variants
+
+def rank_plates(readings: list, find_by_suffix, limit: int = 5) -> list:
+    """
+    OCR 결과 여러 개 → 등록 차량 후보 [(차량번호, 거리)] 거리 순.
+    후보는 끝 4자리 색인(find_by_suffix)에서만 가져오므로 고객 수와 무관하게 빠르다.
+    """
+    best = {}
+    for reading in readings:
+        text = plate_text(reading)
+        suffixes = suffix_variants("".join(ch for ch in text if ch.isdigit()))
+        if not suffixes:
+            continue
+        for customer in find_by_suffix(suffixes):
+            plate = str(customer.get("차량번호", "")).strip()
+            d = edit_distance(text, plate_text(plate))
+            if plate not in best or d < best[plate]:
+                best[plate] = d
+    return sorted(best.items(), key=lambda item: (item[1], item[0]))[:limit]
+
+
+class PlateReader:
+    """
+    프로세스당 1개 (oasis.py 에서 st.cache_resource).
+    cv2/pytesseract import 와 Tesseract 언어 확인을 생성할 때 한 번만 하고,
+    read() 는 사진 1장당 budget 초 안에서 후보 영역을 큰 것부터 읽는다.
+    """
+
+    def __init__(self, budget: float = 0.6, max_width: int = 960, max_regions: int = 3):
+        # 무거운 의존성은 번호판 인식을 쓸 때만 import (없으면 ImportError → 촬영 입력 숨김)
+        import cv2
+        import pytesseract
+        self.cv2 = cv2
+        self.tesseract = pytesseract
+        self.budget = budget
+        self.max_width = max_width
+        self.max_regions = max_regions
+        korean = "kor" in pytesseract.get_languages(config="")
+        self.lang = "kor" if korean else "eng"
+        whitelist = "0123456789" + (PLATE_HANGUL if korean else "")
+        # 한 줄짜리 텍스트(psm 7) + 번호판 글자만
+        self.config = f"--oem 1 --psm 7 -c tessedit_char_whitelist={whitelist}"
+
+    def _decode(self, data: bytes):
+        cv2 = self.cv2
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is not None and gray.shape[1] > self.max_width:
+            scale = self.max_width / gray.shape[1]
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def localize(self, gray) -> list:
+        """윤곽선 중 번호판 비율(가로:세로 2~6)인 사각형 영역을 큰 순서로"""
+        cv2 = self.cv2
+        height, width = gray.shape
+        edges = cv2.Canny(cv2.bilateralFilter(gray, 9, 75, 75), 50, 200)
+        contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:30]:
+            x, y, w, h = cv2.boundingRect(contour)
+            if h == 0 or not 2.0 <= w / h <= 6.0:
+                continue
+            if w * h < 0.005 * width * height or w > 0.95 * width:
+                continue
+            # 이미 고른 영역과 거의 겹치면 건너뜀
+            if any(abs(x - bx) < w * 0.2 and abs(y - by) < h * 0.2 for bx, by, _, _ in boxes):
+                continue
+            boxes.append((x, y, w, h))
+            if len(boxes) >= self.max_regions:
+                break
+        return [gray[y:y + h, x:x + w] for x, y, w, h in boxes]
+
+    def preprocess(self, crop):
+        """글자 높이 맞추기 → Otsu 이진화 → 흰 바탕 검은 글자 + 여백"""
+        cv2 = self.cv2
+        scale = 64 / crop.shape[0]
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        _, binary = cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        if binary.mean() < 127:
+            binary = 255 - binary
+        return cv2.copyMakeBorder(binary, 10, 10, 10, 10, cv2.BORDER_CONSTANT, value=255)
+
+    def read(self, data: bytes):
+        """사진 바이트 → (읽은 문자열 목록, 걸린 ms). 번호판 형식이 나오면 바로 멈춤"""
+        started = time.perf_counter()
+        deadline = started + self.budget
+        gray = self._decode(data)
+        readings = []
+        if gray is not None:
+            # 위치를 못 찾았을 때를 대비해 전체 화면도 마지막 후보로
+            for region in self.localize(gray) + [gray]:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    text = self.tesseract.image_to_string(
+                        self.preprocess(region), lang=self.lang, config=self.config, timeout=remaining
+                    )
+                except RuntimeError:  # pytesseract timeout
+                    break
+                text = plate_text(text)
+                if text:
+                    readings.append(text)
+                if _PLATE.search(text):
+                    break
+        return readings, (time.perf_counter() - started) * 1000
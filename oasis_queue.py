@@ -0,0 +1,413 @@
+# -*- coding: utf-8 -*-
+"""oasis_queue.py - 시트 쓰기 지연 큐 (워커 스레드 + 행별 병합 + 쿼터 오류 재시도)"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from oasis_index import plate_key
+from oasis_journal import decode_changes, encode_changes
+from oasis_sheet import COLUMNS, col_letter, commit_many, merge_changes, resolve_changes, row_to_record
+
+
+def _status_code(exc):
+    """gspread APIError → HTTP 상태 코드 (버전별로 속성 이름이 다름)"""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+def is_retryable(exc) -> bool:
+    """429(쿼터 초과) / 5xx / 네트워크 오류는 재시도, 그 외(권한·범위 오류 등)는 실패 처리"""
+    code = _status_code(exc)
+    if code is None:
+        return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+    return code == 429 or code >= 500
+
+def _open(getter):
+    # 인증/열기 실패는 대부분 연결 문제 → 재시도 대상으로 취급 (저널이 있으면 기록은 남아 있음)
+    try:
+        return getter()
+    except Exception as e:
+        if _status_code(e) is not None or isinstance(e, (ConnectionError, TimeoutError, OSError)):
+            raise
+        raise ConnectionError(f"시트 열기 실패: {type(e).__name__}: {e}") from e
+
+def _entry(changes: dict, plate=None, version=None, token=None, jids=(), recovered=False) -> dict:
+    """
+    행 1개에 대한 쓰기 요청.
+      plate     : 기록 직전에 이 행의 A열과 대조 (다르면 차량번호로 행을 다시 찾음)
+      version   : 화면이 본 R열 버전 (None 이면 대조 안 함)
+      token     : 기록 후 R열에 남길 새 버전 (시트에 이미 이 값이면 반영된 요청 → 건너뜀)
+      jids      : 저널 항목 id (반영 후 저널에서 지움)
+      recovered : 이전 프로세스 저널에서 되살린 요청
+    """
+    return {
+        "plate": plate, "version": version, "token": token, "changes": dict(changes),
+        "jids": list(jids), "recovered": recovered,
+    }
+
+def _merge_entry(older: dict, newer: dict) -> dict:
+    # 기대 버전은 먼저 들어온 요청 것, 새 버전 토큰은 나중 것
+    return {
+        "plate": newer["plate"] or older["plate"],
+        "version": older["version"],
+        "token": newer["token"] or older["token"],
+        "changes": merge_changes(older["changes"], newer["changes"]),
+        "jids": older["jids"] + newer["jids"],
+        "recovered": older["recovered"] or newer["recovered"],
+    }
+
+def _item(row: list, jid=None, recovered=False) -> dict:
+    """신규 행 / 방문 이벤트 1건"""
+    return {"row": list(row), "jid": jid, "recovered": recovered}
+
+
+class WriteQueue:
+    """
+    프로세스당 1개. 화면은 submit() 즉시 반환하고, 워커 스레드가
+    쌓인 변경사항을 행별로 병합해 append_rows 1회 + batch_update 1회로 반영한다.
+    수정할 행은 기록 직전에 batch_get 1회로 다시 읽어 차량번호·버전을 대조하고,
+    Increment 는 그 최신 값 기준으로 푼다. 어긋난 행은 conflicts 에 남기고 on_conflict 를 부른다.
+    방문 이벤트는 방문기록 시트에 append_rows 1회로 붙인다.
+    쿼터/일시 오류는 지수 백오프로 재시도하고, 한도를 넘기면 failed 목록에 남긴다
+    (max_retries=None 이면 끝없이 재시도).
+    journal 을 주면 submit 마다 먼저 저널에 남기고, 시작할 때 남은 항목을 순서대로 다시 넣는다.
+    되살린 항목은 R열 버전 / A열 차량번호 / 방문기록 D열 키로 이미 반영됐는지 확인한 뒤 보낸다.
+    probe() 를 부르면 (보낼 것이 없어도) 시트가 다시 응답할 때까지 백오프로 확인하고 on_reconnect 를 부른다.
+    """
+
+    def __init__(self, worksheet_getter, visit_worksheet_getter=None, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0, on_conflict=None, journal=None, on_reconnect=None):
+        self._worksheet_getter = worksheet_getter
+        self._worksheet = None
+        self._visit_worksheet_getter = visit_worksheet_getter
+        self._visit_worksheet = None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._on_conflict = on_conflict
+        self._on_reconnect = on_reconnect
+        self._journal = journal
+
+        self._rows = OrderedDict()  # row_idx → _entry (병합됨)
+        self._appends = []          # 신규 행 _item 목록
+        self._visits = []           # 방문 이벤트 _item 목록
+        self._inflight = ({}, [], [])  # 워커가 지금 기록 중인 묶음
+        self._failed = []           # {"rows", "appends", "visits", "error", "at"}
+        self._conflicts = deque(maxlen=50)  # {"plate", "row", "reason", "at"}
+        self._attempt = 0
+        self._last_error = ""
+        self._busy = False
+        self._probe = False
+        self._probe_attempt = 0
+        self._cond = threading.Condition()
+        if journal is not None:
+            self._recover()
+        self._thread = threading.Thread(target=self._run, name="oasis-write-queue", daemon=True)
+        self._thread.start()
+
+    # --- 화면 쪽 API ---
+
+    def _add(self, row_idx: int, entry: dict):
+        old = self._rows.get(row_idx)
+        self._rows[row_idx] = _merge_entry(old, entry) if old else entry
+
+    def _log(self, kind: str, payloads: list) -> list:
+        """저널에 먼저 남김 → 항목 id 목록 (저널 없으면 None)"""
+        if self._journal is None:
+            return [None] * len(payloads)
+        return self._journal.add_many(kind, payloads)
+
+    def submit(self, row_idx: int, changes: dict, plate=None, version=None, token=None):
+        if changes:
+            self.submit_many({row_idx: {"changes": changes, "plate": plate, "version": version, "token": token}})
+
+    def submit_many(self, rows: dict):
+        """{row_idx: submit() 키워드 dict(changes, plate, version, token)} 을 한 묶음으로 기록되게 함"""
+        rows = {row_idx: kwargs for row_idx, kwargs in rows.items() if kwargs.get("changes")}
+        jids = self._log("row", [
+            {**kwargs, "row_idx": row_idx, "changes": encode_changes(kwargs["changes"])}
+            for row_idx, kwargs in rows.items()
+        ])
+        with self._cond:
+            for (row_idx, kwargs), jid in zip(rows.items(), jids):
+                self._add(row_idx, _entry(**kwargs, jids=[jid] if jid is not None else []))
+            self._cond.notify()
+
+    def submit_append(self, row: list):
+        jid, = self._log("append", [{"row": list(row)}])
+        with self._cond:
+            self._appends.append(_item(row, jid))
+            self._cond.notify()
+
+    def submit_visit(self, row: list):
+        jid, = self._log("visit", [{"row": list(row)}])
+        with self._cond:
+            self._visits.append(_item(row, jid))
+            self._cond.notify()
+
+    def overlay(self, records: list):
+        """
+        새로 불러온 레코드에 아직 반영 전인 변경사항을 덮어씀 (TTL 재로딩 시 되돌아감 방지).
+        R열이 이미 그 요청의 토큰인 행과 이미 있는 차량번호의 신규 행은 건너뛰므로 같은 레코드에 다시 불러도 됨.
+        행 변경은 _write_rows 처럼 차량번호를 대조하고, 행이 밀렸으면 차량번호로 다시 찾는다 (못 찾으면 건너뜀).
+        """
+        with self._cond:
+            inflight_rows, inflight_appends, _ = self._inflight
+            appends = inflight_appends + self._appends
+            if appends:
+                # 이미 들어 있는 차량번호는 건너뜀 (방금 반영된 행 / 이전에 덮어쓴 레코드를 다시 쓰는 경우)
+                present = {plate_key(r.get("차량번호")) for r in records}
+                appends = [a for a in appends if plate_key(a["row"][0]) not in present]
+            # 신규 행을 먼저 붙여야 그 행을 가리키는 변경도 차량번호로 찾을 수 있음
+            for item in appends:
+                records.append(row_to_record(item["row"]))
+            by_plate = None
+            for row_idx, entry in list(inflight_rows.items()) + list(self._rows.items()):
+                i = row_idx - 2
+                plate = plate_key(entry["plate"]) if entry["plate"] is not None else None
+                if plate is not None and not (0 <= i < len(records) and plate_key(records[i].get("차량번호")) == plate):
+                    # 다른 단말의 보관 이동(행 삭제) 등으로 행이 밀림
+                    if by_plate is None:
+                        by_plate = {plate_key(r.get("차량번호")): j for j, r in enumerate(records)}
+                    i = by_plate.get(plate, -1)
+                if not 0 <= i < len(records):
+                    continue
+                if entry["token"] and str(records[i].get("버전", "")) == entry["token"]:
+                    continue  # 이미 시트에 반영된 요청 (저널에서 되살린 경우)
+                records[i].update(resolve_changes(records[i], entry["changes"]))
+                if entry["token"]:
+                    records[i]["버전"] = entry["token"]
+        return records
+
+    def recovered_visits(self) -> list:
+        """이전 프로세스 저널에서 되살려 아직 보내지 못한 방문 이벤트 행 목록"""
+        with self._cond:
+            return [item["row"] for item in self._inflight[2] + self._visits if item["recovered"]]
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._rows) + len(self._appends) + len(self._visits) + (1 if self._busy else 0),
+                "failed": len(self._failed),
+                "attempt": self._attempt,
+                "last_error": self._last_error,
+                "failed_items": list(self._failed),
+                "conflicts": list(self._conflicts),
+            }
+
+    def clear_conflicts(self):
+        with self._cond:
+            self._conflicts.clear()
+
+    def retry_failed(self):
+        """실패 목록을 다시 큐에 넣음 (이후 들어온 값이 우선)"""
+        with self._cond:
+            failed, self._failed = self._failed, []
+            # 최신 실패부터 넣어야 오래된 값이 새 값을 덮지 않음
+            for item in reversed(failed):
+                self._requeue(item["rows"], item["appends"], item["visits"])
+            self._cond.notify()
+
+    def probe(self):
+        """시트 연결 확인 요청 (화면 쪽에서 읽기가 실패했을 때). 연결되면 on_reconnect 호출"""
+        with self._cond:
+            self._probe = True
+            self._cond.notify()
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """대기 중인 쓰기가 모두 끝날 때까지 대기 (CLI/종료 시용)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._rows or self._appends or self._visits or self._busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.2))
+        return True
+
+    # --- 워커 ---
+
+    def _recover(self):
+        for jid, kind, payload in self._journal.pending():
+            if kind == "row":
+                entry = _entry(
+                    decode_changes(payload["changes"]), payload.get("plate"), payload.get("version"),
+                    payload.get("token"), jids=[jid], recovered=True,
+                )
+                self._add(payload["row_idx"], entry)
+            elif kind == "append":
+                self._appends.append(_item(payload["row"], jid, recovered=True))
+            elif kind == "visit":
+                self._visits.append(_item(payload["row"], jid, recovered=True))
+
+    def _done(self, jids):
+        if self._journal is not None:
+            self._journal.remove(jids)
+
+    def _requeue(self, rows: dict, appends: list, visits: list):
+        # 실패한 묶음이 먼저 들어온 것이므로, 그 사이 들어온 값이 덮어쓰도록 병합
+        pending, self._rows = self._rows, OrderedDict(rows)
+        for row_idx, entry in pending.items():
+            self._add(row_idx, entry)
+        self._appends = appends + self._appends
+        self._visits = visits + self._visits
+
+    def _take(self):
+        with self._cond:
+            while not (self._rows or self._appends or self._visits or self._probe):
+                self._cond.wait()
+            rows, self._rows = self._rows, OrderedDict()
+            appends, self._appends = self._appends, []
+            visits, self._visits = self._visits, []
+            self._busy = bool(rows or appends or visits)
+            self._inflight = (rows, appends, visits)
+            return rows, appends, visits
+
+    def _write(self, rows: dict, appends: list, visits: list):
+        if self._worksheet is None:
+            self._worksheet = _open(self._worksheet_getter)
+        if not (rows or appends or visits):
+            self._worksheet.row_values(1)  # 연결 확인만 (헤더 1행 읽기)
+            return
+        # 신규 행을 먼저 붙여야 그 행을 가리키는 row_idx 변경이 올바른 위치에 기록됨
+        if appends:
+            todo = appends
+            if any(item["recovered"] for item in appends):
+                present = {plate_key(v) for v in self._worksheet.col_values(1)}
+                todo = [a for a in appends if not (a["recovered"] and plate_key(a["row"][0]) in present)]
+            if todo:
+                # 기존 append_row 와 같은 RAW: 전화번호 '010...' 앞자리 0 이 숫자로 바뀌지 않게
+                self._worksheet.append_rows([a["row"] for a in todo], value_input_option="RAW")
+            self._done([a["jid"] for a in appends])
+            appends.clear()
+        if rows:
+            conflicts = self._write_rows(rows)
+            self._done([jid for entry in rows.values() for jid in entry["jids"]])
+            rows.clear()
+            if conflicts:
+                with self._cond:
+                    self._conflicts.extend(conflicts)
+                if self._on_conflict is not None:
+                    self._on_conflict()
+        if visits:
+            if self._visit_worksheet is None:
+                self._visit_worksheet = _open(self._visit_worksheet_getter)
+            todo = visits
+            if any(item["recovered"] for item in visits):
+                keys = set(self._visit_worksheet.col_values(4))
+                todo = [v for v in visits if not (v["recovered"] and len(v["row"]) > 3 and v["row"][3] in keys)]
+            if todo:
+                # 'YYYY-MM-DD HH:MM' 가 날짜 값으로 바뀌면 VisitLog 문자열 비교가 어긋나므로 RAW
+                self._visit_worksheet.append_rows([v["row"] for v in todo], value_input_option="RAW")
+            self._done([v["jid"] for v in visits])
+            visits.clear()
+
+    def _write_rows(self, rows: dict) -> list:
+        """행 범위 읽기 1회로 대조 → Increment 풀기 → batch_update 1회. 충돌 목록 반환"""
+        worksheet = self._worksheet
+        last = col_letter(len(COLUMNS))
+        fresh = worksheet.batch_get([f"A{r}:{last}{r}" for r in rows])
+        updates, conflicts = {}, []
+
+        def conflict(entry, row_idx, reason):
+            conflicts.append({
+                "plate": entry["plate"],
+                "row": row_idx,
+                "reason": reason,
+                "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            })
+
+        for (row_idx, entry), values in zip(rows.items(), fresh):
+            current = row_to_record(values[0] if values else [])
+            target = row_idx
+            if entry["token"] and str(current["버전"]) == entry["token"]:
+                continue  # 이미 반영됨 (저널에서 되살린 요청)
+            if entry["plate"] is not None and plate_key(current["차량번호"]) != plate_key(entry["plate"]):
+                target, current = self._relocate(entry["plate"])
+                if target is not None and entry["token"] and str(current["버전"]) == entry["token"]:
+                    continue
+                if target is None:
+                    conflict(entry, row_idx, "시트에서 차량번호를 찾지 못해 반영하지 않음")
+                    continue
+                conflict(entry, target, f"행 위치가 바뀜 ({row_idx}행 → {target}행에 반영)")
+            elif entry["version"] is not None and str(current["버전"]) != str(entry["version"]):
+                conflict(entry, row_idx, "다른 단말에서 먼저 수정됨 (최신 값 기준으로 반영)")
+            changes = resolve_changes(current, entry["changes"])
+            if entry["token"]:
+                changes["버전"] = entry["token"]
+            updates.setdefault(target, {}).update(changes)
+        commit_many(worksheet, updates)
+        return conflicts
+
+    def _relocate(self, plate):
+        """차량번호로 현재 행을 다시 찾음 → (row_idx, 최신 레코드) 또는 (None, None)"""
+        try:
+            cell = self._worksheet.find(plate_key(plate), in_column=1)
+        except Exception as e:
+            if is_retryable(e):
+                raise
+            cell = None  # 구버전 gspread 는 못 찾으면 CellNotFound 를 던짐
+        if cell is None:
+            return None, None
+        return cell.row, row_to_record(self._worksheet.row_values(cell.row))
+
+    def _reconnected(self):
+        with self._cond:
+            probing, self._probe, self._probe_attempt = self._probe, False, 0
+        if probing and self._on_reconnect is not None:
+            self._on_reconnect()
+
+    def _run(self):
+        while True:
+            rows, appends, visits = self._take()
+            if not (rows or appends or visits):
+                # 연결 확인만: 실패해도 실패 목록에 남길 것이 없으니 백오프 후 다시
+                try:
+                    self._write(rows, appends, visits)
+                except Exception:
+                    self._worksheet = None
+                    self._probe_attempt += 1
+                    delay = min(self.max_delay, self.base_delay * 2 ** min(self._probe_attempt - 1, 16))
+                    time.sleep(delay + random.uniform(0, delay / 4))
+                    continue
+                self._reconnected()
+                continue
+            try:
+                self._write(rows, appends, visits)
+            except Exception as e:
+                retry = is_retryable(e) and (self.max_retries is None or self._attempt < self.max_retries)
+                with self._cond:
+                    self._busy = False
+                    self._inflight = ({}, [], [])
+                    self._last_error = f"{type(e).__name__}: {e}"
+                    if retry:
+                        self._attempt += 1
+                        self._requeue(rows, appends, visits)
+                    else:
+                        self._attempt = 0
+                        self._failed.append({
+                            "rows": rows,
+                            "appends": appends,
+                            "visits": visits,
+                            "error": self._last_error,
+                            "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        })
+                    self._cond.notify_all()
+                if not is_retryable(e):
+                    self._worksheet = None
+                    self._visit_worksheet = None
+                if retry:
+                    delay = min(self.max_delay, self.base_delay * 2 ** min(self._attempt - 1, 16))
+                    time.sleep(delay + random.uniform(0, delay / 4))
+                continue
+            with self._cond:
+                self._busy = False
+                self._inflight = ({}, [], [])
+                self._attempt = 0
+                self._last_error = ""
+                self._cond.notify_all()
+            self._reconnected()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""oasis_recompute.py - 정액제 '남은 이용 일수'(G열) 일괄 재계산
+
+조회 화면에서는 더 이상 G열을 쓰지 않고, 이 배치(또는 관리자 버튼)로 한 번에 갱신한다.
+
+    python oasis_recompute.py            # 바뀐 칸만 batch_update 1회로 반영
+    python oasis_recompute.py --dry-run  # 바뀔 행 수만 출력
+"""
+
+import argparse
+import re
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+from oasis_sheet import COL, col_letter, commit_many, load_secrets, open_spreadsheet, parse_dates
+
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def compute_days_left(plans, expiries, current, today):
+    """
+    정액제 행 전체의 남은 이용 일수 = max(0, 만료일 - 오늘) 를 한 번에 계산.
+    → (값이 바뀐 행 위치 배열, 새 값 문자열 배열)
+    """
+    plans = np.array([str(p or "").strip() for p in plans], dtype=object)
+    expiries = np.array([str(e or "").strip() for e in expiries], dtype=object)
+    current = np.array([str(c if c is not None else "").strip() for c in current], dtype=object)
+
+    valid = (plans != "") & np.array([bool(_DATE.match(e)) for e in expiries], dtype=bool)
+    dates = np.full(len(expiries), np.datetime64("NaT"), dtype="datetime64[D]")
+    dates[valid] = parse_dates(expiries[valid].astype(str))
+    valid &= ~np.isnat(dates)
+
+    days = np.zeros(len(expiries), dtype=np.int64)
+    days[valid] = (dates[valid] - np.datetime64(today, "D")).astype(np.int64)
+    new = np.maximum(days, 0).astype(str).astype(object)
+
+    changed = valid & (current != new)
+    return np.flatnonzero(changed), new[changed]
+
+
+def days_left_changes(records: list, today) -> dict:
+    """레코드 목록 → {차량번호: {"남은 이용 일수": 값}} (바뀐 고객만)"""
+    idx, values = compute_days_left(
+        [r.get("상품 옵션(정액제)") for r in records],
+        [r.get("회원 만료일") for r in records],
+        [r.get("남은 이용 일수") for r in records],
+        today,
+    )
+    return {records[i]["차량번호"]: {"남은 이용 일수": v} for i, v in zip(idx, values)}
+
+
+def recompute_sheet(worksheet, today, dry_run: bool = False) -> int:
+    """F·G·J 열만 범위 읽기 1회 → 계산 → 바뀐 G칸만 batch_update 1회"""
+    f, g, j = (col_letter(COL[c]) for c in ("상품 옵션(정액제)", "남은 이용 일수", "회원 만료일"))
+    fg, jj = worksheet.batch_get([f"{f}2:{g}", f"{j}2:{j}"])
+    n = max(len(fg), len(jj))
+    fg = [list(r) + [""] * (2 - len(r)) for r in fg] + [["", ""]] * (n - len(fg))
+    jj = [r[0] if r else "" for r in jj] + [""] * (n - len(jj))
+
+    idx, values = compute_days_left([r[0] for r in fg], jj, [r[1] for r in fg], today)
+    if len(idx) and not dry_run:
+        commit_many(worksheet, {int(i) + 2: {"남은 이용 일수": v} for i, v in zip(idx, values)})
+    return len(idx)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="정액제 남은 이용 일수 일괄 재계산")
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="서비스 계정이 든 secrets.toml 경로")
+    parser.add_argument("--dry-run", action="store_true", help="시트에 쓰지 않고 바뀔 행 수만 출력")
+    args = parser.parse_args(argv)
+
+    today = datetime.now(pytz.timezone("Asia/Seoul")).strftime("%Y-%m-%d")
+    worksheet = open_spreadsheet(load_secrets(args.secrets)).sheet1
+    n = recompute_sheet(worksheet, today, dry_run=args.dry_run)
+    print(f"{'(dry-run) ' if args.dry_run else ''}남은 이용 일수 {n}행 갱신")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""oasis_sheet.py - 고객 시트 컬럼 정의 + 버튼 1회당 변경사항 일괄 기록"""
+
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import numpy as np
+
+from oasis_index import PlateIndex
+
+# 시트 1행 헤더 순서 그대로 (A=1 ... R=18)
+COLUMNS = [
+    "차량번호",          # A
+    "전화번호",          # B
+    "등록일",            # C
+    "최종 방문일",       # D
+    "총 방문 횟수",      # E
+    "상품 옵션(정액제)", # F
+    "남은 이용 일수",    # G
+    "상품 옵션(회수제)", # H
+    "남은 이용 횟수",    # I
+    "회원 만료일",       # J
+    "블랙리스트",        # K
+    "방문기록",          # L
+    "메모",              # M
+    "재등록 여부",       # N
+    "재등록 횟수",       # O
+    "최근 재등록일",     # P
+    "최근 재등록 유형",  # Q
+    "버전",              # R  (행을 고칠 때마다 새 토큰 → 다른 단말의 수정 감지)
+]
+COL = {name: i + 1 for i, name in enumerate(COLUMNS)}
+
+PLAN_DAYS = 30
+
+SPREADSHEET_TITLE = "Oasis Customer Management"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+
+def load_secrets(path: str = ".streamlit/secrets.toml") -> dict:
+    """CLI 용: Streamlit 없이 secrets.toml 읽기"""
+    import tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+def authorize(service_account_info):
+    # gspread/google-auth 는 시트에 실제로 붙을 때만 import (오프라인 도구에서도 이 모듈을 씀)
+    import gspread
+    from google.oauth2.service_account import Credentials
+    credentials = Credentials.from_service_account_info(dict(service_account_info), scopes=SCOPES)
+    return gspread.authorize(credentials)
+
+def open_spreadsheet(secrets: dict):
+    """spreadsheet_key 가 있으면 키로 바로 열기 (제목 검색은 Drive API 를 한 번 더 씀)"""
+    client = authorize(secrets["gcp_service_account"])
+    key = secrets.get("spreadsheet_key")
+    return client.open_by_key(key) if key else client.open(SPREADSHEET_TITLE)
+
+
+def call_with_timeout(fn, timeout: float):
+    """fn() 을 별도 스레드에서 실행해 timeout 초 안에 안 끝나면 TimeoutError (연결이 멈춰도 화면은 안 멈춤)"""
+    result = {}
+
+    def run():
+        try:
+            result["value"] = fn()
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, name="oasis-sheet-call", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"시트 응답 없음 ({timeout:.0f}초)")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def to_int(v, default=0):
+    """시트 셀 값 → int (빈 칸·숫자가 아니면 default)"""
+    try:
+        return int(str(v).strip())
+    except Exception:
+        return default
+
+def parse_dates(values: np.ndarray) -> np.ndarray:
+    """'YYYY-MM-DD' 배열 → datetime64[D] (2월 30일 같은 잘못된 날짜는 NaT)"""
+    try:
+        return values.astype("datetime64[D]")
+    except ValueError:
+        out = np.full(len(values), np.datetime64("NaT"), dtype="datetime64[D]")
+        for i, v in enumerate(values):
+            try:
+                out[i] = np.datetime64(v, "D")
+            except ValueError:
+                pass
+        return out
+
+def col_letter(col: int) -> str:
+    """1 → A, 27 → AA"""
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def ticket_count(option: str) -> int:
+    """회수권 상품명 → 충전 횟수"""
+    return 1 if "1회" in option else (5 if "5회" in option else 10)
+
+def new_version() -> str:
+    """R열 버전 토큰 (단말 간 충돌 감지용, 값 자체에는 의미 없음)"""
+    # 'v' 접두사: '012345678901' / '1e5...' 같은 hex 는 USER_ENTERED 로 쓰면 숫자가 돼 다시 읽은 값이 토큰과 달라짐
+    return "v" + uuid.uuid4().hex[:11]
+
+
+# --- 카운터 증감 ---
+
+class Increment:
+    """
+    카운터 칸의 '상대 변경' (예: 총 방문 횟수 +1).
+    캐시 값이 아니라 기록 직전에 읽은 최신 값에 더하므로
+    두 단말이 같은 차량을 동시에 기록해도 한쪽 증감이 사라지지 않는다.
+    """
+    __slots__ = ("n",)
+
+    def __init__(self, n: int):
+        self.n = n
+
+    def __repr__(self):
+        return f"Increment({self.n:+d})"
+
+def apply_change(current, change):
+    """현재 값에 변경 1개 적용 (Increment 면 더하고, 아니면 그 값으로 교체)"""
+    if isinstance(change, Increment):
+        return str(to_int(current) + change.n)
+    return change
+
+def merge_change(older, newer):
+    """같은 칸에 대한 두 변경을 하나로 (쓰기 큐 병합용)"""
+    if isinstance(newer, Increment):
+        if isinstance(older, Increment):
+            return Increment(older.n + newer.n)
+        return apply_change(older, newer)
+    return newer
+
+def merge_changes(older: dict, newer: dict) -> dict:
+    merged = dict(older)
+    for name, value in newer.items():
+        merged[name] = merge_change(merged[name], value) if name in merged else value
+    return merged
+
+def resolve_changes(record: dict, changes: dict) -> dict:
+    """Increment 를 record 값 기준으로 풀어 실제 기록할 {헤더: 값} 반환"""
+    return {name: apply_change(record.get(name), value) for name, value in changes.items()}
+
+
+# --- 액션별 변경사항 {헤더: 값} ---
+
+def reregistration_changes(now_str: str, rereg_type: str) -> dict:
+    """
+    재등록 인덱스 컬럼:
+      N(14): 재등록 여부 = Y
+      O(15): 재등록 횟수 = 누적 정수 (+1)
+      P(16): 최근 재등록일 = now_str
+      Q(17): 최근 재등록 유형 = '정액제' 또는 '회수제'
+    """
+    return {
+        "재등록 여부": "Y",
+        "재등록 횟수": Increment(1),
+        "최근 재등록일": now_str,
+        "최근 재등록 유형": str(rereg_type),
+    }
+
+def visit_changes(log_type: str, today: str) -> dict:
+    """방문 기록: (회수제면 I열 -1) + D/E열 (방문 로그는 Storage.append_visit)"""
+    changes = {}
+    if log_type == "회수제":
+        changes["남은 이용 횟수"] = Increment(-1)
+    changes["최종 방문일"] = today
+    changes["총 방문 횟수"] = Increment(1)
+    return changes
+
+def renew_fixed_changes(plan: str, now, now_str: str, today: str) -> dict:
+    """정액제 갱신: 만료일 재설정 + 방문 1회 + 재등록 인덱스 ((재등록) 로그는 Storage.append_visit)"""
+    expire = now + timedelta(days=PLAN_DAYS)
+    changes = {
+        "상품 옵션(정액제)": plan,
+        "남은 이용 일수": str(PLAN_DAYS),
+        "회원 만료일": expire.strftime("%Y-%m-%d"),
+        "총 방문 횟수": Increment(1),
+        "최종 방문일": today,
+    }
+    changes.update(reregistration_changes(now_str, "정액제"))
+    return changes
+
+def topup_changes(option: str, now_str: str) -> dict:
+    """회수권 충전 + 재등록 인덱스"""
+    changes = {
+        "남은 이용 횟수": str(ticket_count(option)),
+        "상품 옵션(회수제)": option,
+    }
+    changes.update(reregistration_changes(now_str, "회수제"))
+    return changes
+
+def add_product_changes(jung: str | None, hue: str | None, now) -> dict:
+    """기존 고객에게 새 상품 추가 (선택 안 한 쪽은 None)"""
+    changes = {}
+    if jung:
+        changes["상품 옵션(정액제)"] = jung
+        changes["남은 이용 일수"] = str(PLAN_DAYS)
+        changes["회원 만료일"] = (now + timedelta(days=PLAN_DAYS)).strftime("%Y-%m-%d")
+    if hue:
+        changes["남은 이용 횟수"] = str(ticket_count(hue))
+        changes["상품 옵션(회수제)"] = hue
+    return changes
+
+def memo_changes(memo: str) -> dict:
+    return {"메모": memo}
+
+
+def commit_changes(worksheet, row_idx: int, changes: dict):
+    """한 행의 변경사항을 batch_update 1회로 기록 (컬럼 수와 무관하게 왕복 1번)"""
+    commit_many(worksheet, {row_idx: changes})
+
+def commit_many(worksheet, rows: dict, value_input_option: str = "USER_ENTERED"):
+    """
+    {row_idx: {헤더: 값}} 여러 행을 batch_update 1회로 기록 (Increment 는 미리 풀어서 넘길 것).
+    기본은 update_cell 과 동일한 USER_ENTERED, 문자열 그대로 남길 때는 RAW.
+    """
+    data = [
+        {"range": f"{col_letter(COL[name])}{row_idx}", "values": [[value]]}
+        for row_idx, changes in rows.items()
+        for name, value in changes.items()
+    ]
+    if not data:
+        return
+    worksheet.batch_update(data, value_input_option=value_input_option)
+
+def record_to_row(record: dict) -> list:
+    return ["" if record.get(name) is None else record.get(name) for name in COLUMNS]
+
+def row_to_record(row: list) -> dict:
+    return {name: (row[i] if i < len(row) else "") for i, name in enumerate(COLUMNS)}
+
+def raw_records(worksheet) -> list:
+    """
+    get_all_values() → 레코드 목록 (2행부터, 시트 행 순서 그대로).
+    get_all_records() 와 달리 '010...' 같은 숫자 모양 문자열을 int 로 바꾸지 않으므로
+    읽은 값을 다시 시트에 쓰는 경로(SQLite 적재, 보관 시트)에서 쓴다.
+    """
+    return [row_to_record(v) for v in worksheet.get_all_values()[1:]]
+
+def ensure_header(worksheet):
+    """1행 헤더에 빠진 뒤쪽 컬럼(예: 버전)이 있으면 채워 넣음 (기존 시트 이관용)"""
+    header = worksheet.row_values(1)
+    if len(header) >= len(COLUMNS):
+        return
+    header = list(header) + COLUMNS[len(header):]
+    worksheet.batch_update([{"range": f"A1:{col_letter(len(COLUMNS))}1", "values": [header]}])
+
+
+class RecordCache:
+    """
+    get_all_records() 결과를 프로세스 메모리에 보관하는 write-through 캐시.
+    쓰기 성공 후에는 해당 행만 패치(또는 추가)하고,
+    전체 재로딩은 TTL 만료 또는 강제 새로고침 때만 한다.
+    차량번호 색인(PlateIndex)도 로딩 1회당 한 번만 만든다.
+    """
+
+    def __init__(self, loader, ttl: float = 60):
+        self._loader = loader
+        self.ttl = ttl
+        self._records = None
+        self._loaded_at = 0.0
+        self._index = None
+        self.generation = 0  # 전체 재로딩할 때마다 +1
+        self._lock = threading.RLock()
+
+    def is_stale(self) -> bool:
+        return self._records is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def records(self, force: bool = False) -> list:
+        with self._lock:
+            if force or self.is_stale():
+                self._records = list(self._loader())
+                self._loaded_at = time.monotonic()
+                self._index = None
+                self.generation += 1
+            return self._records
+
+    def index(self) -> PlateIndex:
+        with self._lock:
+            records = self.records()
+            if self._index is None:
+                self._index = PlateIndex(records)
+            return self._index
+
+    def cached_index(self):
+        """다시 읽지 않고 지금 가진 레코드의 색인 (읽은 적 없으면 None, 시트가 끊겼을 때용)"""
+        with self._lock:
+            if self._records is None:
+                return None
+            if self._index is None:
+                self._index = PlateIndex(self._records)
+            return self._index
+
+    def patch(self, row_idx: int, changes: dict):
+        """시트 row_idx(2행부터 데이터) 레코드에 변경사항 반영"""
+        with self._lock:
+            i = row_idx - 2
+            if self._records is not None and 0 <= i < len(self._records):
+                self._records[i].update(resolve_changes(self._records[i], changes))
+
+    def append(self, row: list) -> int:
+        """append_row 한 값을 레코드로 추가하고 새 row_idx 반환"""
+        record = row_to_record(row)
+        with self._lock:
+            if self._records is None:
+                return 0
+            self._records.append(record)
+            row_idx = len(self._records) + 1
+            if self._index is not None:
+                self._index.add(record, row_idx)
+            return row_idx
+
+    def invalidate(self):
+        with self._lock:
+            self._records = None
+            self._index = None
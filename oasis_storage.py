@@ -0,0 +1,757 @@
+# -*- coding: utf-8 -*-
+"""oasis_storage.py - 저장소 인터페이스 + 구글 시트 / 로컬 SQLite 구현"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from oasis_index import digit_suffix, plate_key
+from oasis_journal import decode_changes, encode_changes
+from oasis_queue import WriteQueue, is_retryable
+from oasis_archive import archive_inactive
+from oasis_sheet import (
+    COLUMNS,
+    PLAN_DAYS,
+    Increment,
+    RecordCache,
+    call_with_timeout,
+    col_letter,
+    commit_many,
+    merge_changes,
+    new_version,
+    raw_records,
+    record_to_row,
+    resolve_changes,
+    row_to_record,
+)
+from oasis_visits import VisitLog, parse_legacy_log, visit_row
+
+
+class Storage:
+    """
+    화면(oasis.py)이 쓰는 저장소 인터페이스. 고객은 차량번호로 식별한다.
+      load / get / search / exists : 조회 (보관된 고객 포함, is_archived 로 구분)
+      update / append_customer / append_visit : 기록 (카운터는 Increment 로 넘김)
+      visit_summary : 최근 방문일 + 정액제 기간 내 방문 횟수 (방문 이벤트 집계)
+      status / retry_failed / clear_conflicts : 시트 반영 현황 + 다른 단말과의 충돌
+                                                + 시트 연결 끊김(offline, snapshot_at)
+    """
+
+    def load(self, force: bool = False) -> list:
+        raise NotImplementedError
+
+    def is_stale(self) -> bool:
+        return False
+
+    def get(self, plate):
+        """차량번호 정확 일치 → 고객 dict 또는 None"""
+        raise NotImplementedError
+
+    def exists(self, plate) -> bool:
+        return self.get(plate) is not None
+
+    def is_archived(self, plate) -> bool:
+        """보관 시트에만 있는 고객인지 (기록하면 고객 시트로 되돌아감)"""
+        return False
+
+    def search(self, query: str) -> list:
+        """'전체 또는 끝 4자리' 부분 일치 → 고객 dict 목록 (시트 순서)"""
+        raise NotImplementedError
+
+    def find_by_suffix(self, suffixes: list) -> list:
+        """끝 4자리 숫자가 suffixes 중 하나인 고객 목록 (번호판 인식 후보용)"""
+        return [r for suffix in suffixes for r in self.search(suffix) if digit_suffix(plate_key(r.get("차량번호"))) == suffix]
+
+    def update(self, plate, changes: dict):
+        raise NotImplementedError
+
+    def update_many(self, changes_by_plate: dict):
+        """{차량번호: {헤더: 값}} 일괄 수정 (배치 작업용)"""
+        for plate, changes in changes_by_plate.items():
+            self.update(plate, changes)
+
+    def append_customer(self, row: list):
+        raise NotImplementedError
+
+    def append_visit(self, plate, when: str, kind: str):
+        """방문 이벤트 1건 추가 (when 예: '2025-01-01 10:00', kind 예: '정액제')"""
+        raise NotImplementedError
+
+    def visit_summary(self, customer: dict, expire_date=None):
+        """→ (최근 방문일 또는 None, 만료 30일 전 ~ 만료일 사이 방문 횟수)"""
+        raise NotImplementedError
+
+    def visit_counts(self) -> dict:
+        """방문 이벤트 {(날짜 'YYYY-MM-DD', 유형): 횟수} (L열 이관 전 기록 제외, 통계용)"""
+        raise NotImplementedError
+
+    def data_version(self):
+        """데이터가 바뀌면 달라지는 값 (통계 캐시 키)"""
+        raise NotImplementedError
+
+    def status(self) -> dict:
+        return {
+            "pending": 0, "failed": 0, "attempt": 0, "last_error": "", "failed_items": [], "conflicts": [],
+            "offline": "", "snapshot_at": None,
+        }
+
+    def retry_failed(self):
+        pass
+
+    def clear_conflicts(self):
+        pass
+
+
+# -------------------------------------------------------------------
+# 구글 시트 (기존 동작: 메모리 캐시 + 색인 + 쓰기 큐)
+# -------------------------------------------------------------------
+class SheetsStorage(Storage):
+    """
+    고객 시트(최근 고객)만 TTL 로 재로딩한다. 보관 시트는 고객 시트에서 못 찾았을 때만
+    처음 읽어 archive_ttl 동안 캐시하고, 보관 고객에게 기록하면 고객 시트 끝에 다시 붙인다.
+    journal 을 주면 쓰기는 이 기기에 먼저 남기고(시트가 안 돼도 기록 가능),
+    시트를 timeout 초 안에 못 읽으면 마지막으로 읽은 레코드(없으면 저널 저장본) + 미반영 기록으로 화면을 보여준다.
+    한 번 못 읽으면 offline 으로 표시하고, 쓰기 큐가 다시 연결될 때까지 화면 경로에서는 시트를 부르지 않는다.
+    """
+
+    def __init__(self, worksheet_getter, visit_worksheet_getter, ttl: float = 60, archive_worksheet_getter=None, archive_ttl: float = 600, journal=None, timeout: float = 15, snapshot_interval: float = 300):
+        self.journal = journal
+        self.timeout = timeout
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_saved = 0.0
+        self.offline = ""  # 시트를 못 읽은 이유 (정상이면 "")
+        self.snapshot_at = None
+        self._last_records = None  # 마지막으로 돌려준 레코드 (끊겼을 때 이어서 씀)
+        self._last_loaded_at = None
+        # 다른 단말과 어긋난 행이 있으면 다음 rerun 에서 전체 재로딩
+        self.queue = WriteQueue(
+            worksheet_getter, visit_worksheet_getter,
+            max_retries=None if journal is not None else 6,
+            on_conflict=lambda: self.cache.invalidate(),
+            journal=journal,
+            on_reconnect=self._back_online,
+        )
+        self.cache = RecordCache(self._load_records, ttl=ttl)
+        self._worksheet_getter = worksheet_getter
+        self._archive_worksheet_getter = archive_worksheet_getter
+        # 보관 고객은 되돌릴 때 행 전체를 다시 붙이므로 '010...' 이 숫자가 되지 않게 문자열 그대로 읽음
+        self.archive = RecordCache(
+            lambda: call_with_timeout(lambda: raw_records(archive_worksheet_getter()), self.timeout), ttl=archive_ttl
+        )
+        self._visit_worksheet_getter = visit_worksheet_getter
+        self._visit_worksheet = None
+        self.visits = VisitLog()
+        # 저널에서 되살린 방문도 화면 집계에 넣음 (시트에 이미 있으면 add_rows 가 한 번 건너뜀)
+        for row in self.queue.recovered_visits():
+            self.visits.add(row[0], row[1], local=True, kind=row[2])
+        self._visit_rows_read = 0
+        self._visit_generation = -1
+        self._visit_lock = threading.Lock()
+
+    def _go_offline(self, e):
+        """시트 읽기 실패: 쓰기 큐가 다시 연결할 때까지 화면 경로에서는 시트를 부르지 않음"""
+        self.offline = f"{type(e).__name__}: {e}"
+        # 보관 시트/방문기록 읽기 실패로 끊긴 경우에도 화면은 마지막으로 읽은 레코드를 보여 주고 있음
+        self.snapshot_at = self._last_loaded_at
+        self.queue.probe()
+
+    def _back_online(self):
+        # 쓰기 큐 워커에서 호출 → 다음 rerun 에서 시트를 다시 읽음
+        if self.offline:
+            self.offline = ""
+            self.cache.invalidate()
+
+    def _offline_records(self):
+        """끊겼을 때 보여줄 레코드 (이 프로세스가 마지막으로 읽은 것, 없으면 저널 저장본) 또는 None"""
+        if self._last_records is not None:
+            self.snapshot_at = self._last_loaded_at
+            # 덮어쓴 미반영 기록은 overlay 가 토큰/차량번호로 건너뛰므로 복사본에 다시 덮어도 됨
+            return [dict(r) for r in self._last_records]
+        if self.journal is not None:
+            snapshot, saved_at = self.journal.load_snapshot("customers")
+            if snapshot is not None:
+                self.snapshot_at = self._last_loaded_at = saved_at
+                return snapshot
+        return None
+
+    def _load_records(self) -> list:
+        records = self._offline_records() if self.offline else None
+        if records is None:
+            try:
+                records = call_with_timeout(lambda: self._worksheet_getter().get_all_records(), self.timeout)
+            except Exception as e:
+                self._go_offline(e)
+                records = self._offline_records()
+                if records is None:
+                    raise
+            else:
+                self.offline, self.snapshot_at = "", None
+                self._last_loaded_at = time.time()
+                if self.journal is not None and time.monotonic() - self._snapshot_saved > self.snapshot_interval:
+                    self.journal.save_snapshot("customers", records)
+                    self._snapshot_saved = time.monotonic()
+        self._last_records = self.queue.overlay(records)
+        return self._last_records
+
+    def load(self, force=False):
+        return self.cache.records(force=force)
+
+    def is_stale(self):
+        return self.cache.is_stale()
+
+    def _locate(self, plate):
+        return self.cache.index().get(plate)
+
+    def _archive_index(self):
+        """보관 시트 색인. 시트가 끊겼으면 이미 읽어 둔 것만 (없으면 None → 보관 고객은 못 찾은 것으로)"""
+        if self._archive_worksheet_getter is None:
+            return None
+        if self.offline:
+            return self.archive.cached_index()
+        try:
+            return self.archive.index()
+        except Exception as e:
+            if is_retryable(e):
+                self._go_offline(e)
+            return self.archive.cached_index()
+
+    def _archived(self, plate):
+        archive = self._archive_index()
+        return archive.get(plate)[0] if archive is not None else None
+
+    def get(self, plate):
+        customer = self._locate(plate)[0]
+        return customer if customer is not None else self._archived(plate)
+
+    def exists(self, plate):
+        return plate in self.cache.index() or self._archived(plate) is not None
+
+    def is_archived(self, plate):
+        return plate not in self.cache.index() and self._archived(plate) is not None
+
+    def search(self, query):
+        index = self.cache.index()
+        found = [index.records[i - 2] for i in index.search(query)]
+        archive = None if found else self._archive_index()
+        if archive is None:
+            return found
+        return [archive.records[i - 2] for i in archive.search(query)]
+
+    def find_by_suffix(self, suffixes):
+        index = self.cache.index()
+        found = [index.records[i - 2] for s in suffixes for i in index.by_suffix.get(s, ())]
+        archive = None if found else self._archive_index()
+        if archive is None:
+            return found
+        return [archive.records[i - 2] for s in suffixes for i in archive.by_suffix.get(s, ())]
+
+    def _restore(self, plate):
+        """보관 고객을 고객 시트 끝에 다시 붙임 (보관 시트의 옛 행은 다음 보관 작업 때 지움)"""
+        archived = self._archived(plate)
+        if archived is None:
+            return
+        row = record_to_row(archived)
+        self.cache.append(row)
+        self.queue.submit_append(row)
+
+    def _prepare(self, plate, changes):
+        """캐시에 바로 반영하고 큐에 넣을 요청(차량번호 + 화면이 본 버전 + 새 버전) 반환"""
+        customer, row_idx = self._locate(plate)
+        if row_idx is None and changes:
+            self._restore(plate)
+            customer, row_idx = self._locate(plate)
+        if row_idx is None or not changes:
+            return None, None
+        version, token = str(customer.get("버전", "")), new_version()
+        self.cache.patch(row_idx, {**changes, "버전": token})
+        return row_idx, {"changes": changes, "plate": plate, "version": version, "token": token}
+
+    def update(self, plate, changes):
+        row_idx, request = self._prepare(plate, changes)
+        if row_idx is not None:
+            self.queue.submit(row_idx, **request)
+
+    def update_many(self, changes_by_plate):
+        rows = {}
+        for plate, changes in changes_by_plate.items():
+            row_idx, request = self._prepare(plate, changes)
+            if row_idx is not None:
+                rows[row_idx] = request
+        self.queue.submit_many(rows)
+
+    def append_customer(self, row):
+        self.cache.index()
+        self.cache.append(row)
+        self.queue.submit_append(row)
+
+    def _visit_log(self) -> VisitLog:
+        # 고객 데이터를 다시 불러올 때마다 방문기록 시트에서 새로 붙은 행만 범위 읽기
+        self.cache.records()
+        with self._visit_lock:
+            if self._visit_generation != self.cache.generation and not self.offline:
+                # 시트가 안 되면 건너뜀 (이미 읽은 것 + 이 기기 기록으로 집계, 다시 연결되면 재로딩 때 읽음)
+                self._visit_generation = self.cache.generation
+                try:
+                    rows = call_with_timeout(self._read_new_visits, self.timeout)
+                except Exception as e:
+                    if is_retryable(e):
+                        self._go_offline(e)
+                    rows = []
+                self.visits.add_rows(rows)
+                self._visit_rows_read += len(rows)
+            return self.visits
+
+    def _read_new_visits(self) -> list:
+        if self._visit_worksheet is None:
+            self._visit_worksheet = self._visit_worksheet_getter()
+        return self._visit_worksheet.get(f"A{self._visit_rows_read + 2}:C")
+
+    def append_visit(self, plate, when, kind):
+        # 읽고-고쳐-쓰기 없이 이벤트 1행만 추가 (키로 저널 재전송 시 중복 방지)
+        self._visit_log().add(plate, when, local=True, kind=kind)
+        self.queue.submit_visit(visit_row(plate, when, kind, new_version()))
+
+    def visit_summary(self, customer, expire_date=None):
+        return self._visit_log().summary(customer, expire_date)
+
+    def visit_counts(self):
+        return dict(self._visit_log().daily)
+
+    def data_version(self):
+        # 전체 재로딩 단위 (화면 기록은 다음 TTL 재로딩 때 통계에 반영)
+        self.cache.records()
+        return self.cache.generation
+
+    def status(self):
+        return {**self.queue.status(), "offline": self.offline, "snapshot_at": self.snapshot_at}
+
+    def retry_failed(self):
+        self.queue.retry_failed()
+
+    def clear_conflicts(self):
+        self.queue.clear_conflicts()
+
+    def archive_inactive(self, spreadsheet, months: int, today: str):
+        """
+        대기 중인 쓰기를 모두 반영한 뒤 보관 작업 실행, 두 캐시 모두 다시 읽게 함 → 옮긴 고객 수.
+        쓰기가 다 반영되지 않으면 None (행을 지우면 대기 중인 행 번호가 어긋나므로 보관하지 않음).
+        """
+        if not self.queue.flush():
+            return None
+        n = archive_inactive(spreadsheet, self._worksheet_getter(), self._archive_worksheet_getter(), months, today)
+        self.cache.invalidate()
+        self.archive.invalidate()
+        return n
+
+
+# -------------------------------------------------------------------
+# 로컬 SQLite (조회는 로컬, 시트는 주기적 일괄 동기화 대상)
+# -------------------------------------------------------------------
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+_COL_SQL = ", ".join(_q(c) for c in COLUMNS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS customers (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    {", ".join(_q(c) + (" TEXT NOT NULL UNIQUE" if c == "차량번호" else " TEXT NOT NULL DEFAULT ''") for c in COLUMNS)},
+    plate_suffix TEXT NOT NULL DEFAULT '',
+    sheet_row INTEGER,
+    dirty INTEGER NOT NULL DEFAULT 0,
+    pending TEXT NOT NULL DEFAULT '',
+    sending TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_customers_suffix ON customers(plate_suffix);
+CREATE INDEX IF NOT EXISTS idx_customers_dirty ON customers(dirty) WHERE dirty > 0;
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    plate TEXT NOT NULL,
+    visited_at TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT '',
+    synced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_visits_plate ON visits(plate, visited_at);
+CREATE INDEX IF NOT EXISTS idx_visits_unsynced ON visits(id) WHERE synced = 0;
+"""
+
+
+def _dump_changes(changes: dict) -> str:
+    return json.dumps(encode_changes(changes), ensure_ascii=False) if changes else ""
+
+def _load_changes(text: str) -> dict:
+    return decode_changes(json.loads(text)) if text else {}
+
+def _appended_start_row(response, worksheet, n: int):
+    """append_rows 응답의 updatedRange('시트1'!A101:Q103) → 첫 행 번호"""
+    try:
+        updated = response["updates"]["updatedRange"]
+        return int(re.search(r"![A-Z]+(\d+)", updated).group(1))
+    except Exception:
+        return len(worksheet.col_values(1)) - n + 1
+
+
+class SQLiteStorage(Storage):
+    """
+    조회·기록은 로컬 SQLite, 시트는 sync_to_sheet 로 일괄 반영.
+    수정은 행의 pending 에 쓰기 큐처럼 병합해 두고(Increment 유지), 동기화 때 시트 행을 다시 읽어
+    버전을 대조한 뒤 바뀐 칸만 RAW 로 보낸다. 보내는 중인 묶음은 sending 에 토큰과 함께 남겨
+    응답을 못 받은 전송을 다시 보낼 때 같은 증감이 두 번 더해지지 않게 한다.
+    """
+
+    def __init__(self, path: str = "oasis.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            # 예전 DB 파일에 없는 컬럼(예: 버전) 추가
+            have = {r["name"] for r in self._conn.execute("PRAGMA table_info(customers)")}
+            for c in COLUMNS:
+                if c not in have:
+                    self._conn.execute(f"ALTER TABLE customers ADD COLUMN {_q(c)} TEXT NOT NULL DEFAULT ''")
+            for c in ("pending", "sending"):
+                if c not in have:
+                    self._conn.execute(f"ALTER TABLE customers ADD COLUMN {c} TEXT NOT NULL DEFAULT ''")
+            if "pending" not in have:
+                # 예전 DB 의 미동기화 행은 로컬 값 전체를 보낼 변경으로 (이후로는 바뀐 칸만)
+                for r in self._conn.execute(f"SELECT seq, {_COL_SQL} FROM customers WHERE dirty > 0").fetchall():
+                    pending = {c: r[c] for c in COLUMNS[1:] if c != "버전"}
+                    self._conn.execute("UPDATE customers SET pending = ? WHERE seq = ?", (_dump_changes(pending), r["seq"]))
+
+        self._version = 0  # 이 프로세스에서 쓴 횟수
+        self._published = None  # data_version() 이 돌려주는 (쓴 횟수, 갱신 시각)
+        self.version_interval = 60.0
+        self._conflicts = deque(maxlen=50)  # {"plate", "row", "reason", "at"}
+        self._sync_thread = None
+        self._sync_wakeup = threading.Event()
+        self._sync_attempt = 0
+        self._sync_error = ""
+
+    def _select(self, where: str = "", params=()):
+        with self._lock:
+            cur = self._conn.execute(f"SELECT {_COL_SQL} FROM customers {where} ORDER BY seq", params)
+            return [dict(r) for r in cur.fetchall()]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM customers LIMIT 1").fetchone() is None
+
+    def import_records(self, records: list, on_sheet: bool = True):
+        """
+        시트 레코드(raw_records: 문자열 그대로)로 초기 적재 (시트 행 번호 유지, 중복 차량번호는 첫 행 우선).
+        on_sheet=False 는 보관 시트 고객: 행 번호 없이 넣어 두고, 수정되면 고객 시트에 새로 붙인다.
+        """
+        rows = []
+        for i, r in enumerate(records):
+            plate = plate_key(r.get("차량번호"))
+            if not plate:
+                continue
+            values = ["" if r.get(c) is None else str(r.get(c)) for c in COLUMNS]
+            values[0] = plate
+            rows.append(values + [digit_suffix(plate), i + 2 if on_sheet else None])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO customers ({_COL_SQL}, plate_suffix, sheet_row) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})",
+                rows,
+            )
+            self._version += 1
+
+    def import_visits(self, rows: list):
+        """방문기록 시트 행([차량번호, 방문일시, 유형])으로 초기 적재 (이미 시트에 있으므로 synced=1)"""
+        data = [
+            (plate_key(r[0]), str(r[1]), str(r[2]) if len(r) > 2 else "")
+            for r in rows if len(r) >= 2 and r[0] and r[1]
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO visits (plate, visited_at, kind, synced) VALUES (?, ?, ?, 1)", data
+            )
+            self._version += 1
+
+    def load(self, force=False):
+        return self._select()
+
+    def get(self, plate):
+        rows = self._select(f"WHERE {_q('차량번호')} = ?", (plate_key(plate),))
+        return rows[0] if rows else None
+
+    def search(self, query):
+        q = plate_key(query)
+        if not q:
+            return []
+        # 끝 4자리 색인만 보면 '12가 34' 같은 오탐과 '1234가 5678' 누락이 생김 → 항상 부분 일치
+        return self._select(f"WHERE instr({_q('차량번호')}, ?) > 0", (q,))
+
+    def find_by_suffix(self, suffixes):
+        if not suffixes:
+            return []
+        return self._select(f"WHERE plate_suffix IN ({', '.join('?' * len(suffixes))})", tuple(suffixes))
+
+    def update(self, plate, changes):
+        if not changes:
+            return
+        plate = plate_key(plate)
+        # 카운터는 UPDATE 안에서 더해 읽고-고쳐-쓰기 경합을 없앰
+        sets = ", ".join(
+            f"{_q(name)} = CAST(CAST({_q(name)} AS INTEGER) + ? AS TEXT)" if isinstance(v, Increment) else f"{_q(name)} = ?"
+            for name, v in changes.items()
+        )
+        with self._lock, self._conn:
+            row = self._conn.execute(f"SELECT pending FROM customers WHERE {_q('차량번호')} = ?", (plate,)).fetchone()
+            if row is None:
+                return
+            # 시트로 보낼 변경은 병합해 둠 (Increment 는 동기화 때 시트의 최신 값에 더함)
+            pending = merge_changes(_load_changes(row["pending"]), changes)
+            self._conn.execute(
+                f"UPDATE customers SET {sets}, pending = ?, dirty = dirty + 1 WHERE {_q('차량번호')} = ?",
+                [v.n if isinstance(v, Increment) else str(v) for v in changes.values()] + [_dump_changes(pending), plate],
+            )
+            self._version += 1
+
+    def update_many(self, changes_by_plate):
+        with self._lock, self._conn:
+            for plate, changes in changes_by_plate.items():
+                self.update(plate, changes)
+
+    def append_customer(self, row):
+        record = row_to_record(row)
+        plate = plate_key(record["차량번호"])
+        values = [str(record[c]) for c in COLUMNS]
+        values[0] = plate
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO customers ({_COL_SQL}, plate_suffix, dirty) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 2))})",
+                values + [digit_suffix(plate), 1],
+            )
+            self._version += 1
+
+    def append_visit(self, plate, when, kind):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO visits (plate, visited_at, kind) VALUES (?, ?, ?)",
+                (plate_key(plate), when, kind),
+            )
+            self._version += 1
+
+    def visit_summary(self, customer, expire_date=None):
+        plate = plate_key(customer.get("차량번호"))
+        # 이관 전 기록(L열) + 이벤트 테이블
+        legacy = parse_legacy_log(customer.get("방문기록", ""))
+        with self._lock:
+            last = self._conn.execute(
+                "SELECT MAX(visited_at) FROM visits WHERE plate = ?", (plate,)
+            ).fetchone()[0]
+        last = max(filter(None, [last, legacy[-1] if legacy else None]), default=None)
+        in_window = 0
+        if expire_date is not None:
+            start = (expire_date - timedelta(days=PLAN_DAYS)).strftime("%Y-%m-%d")
+            end = expire_date.strftime("%Y-%m-%d") + "~"
+            with self._lock:
+                in_window = self._conn.execute(
+                    "SELECT COUNT(*) FROM visits WHERE plate = ? AND visited_at >= ? AND visited_at <= ?",
+                    (plate, start, end),
+                ).fetchone()[0]
+            in_window += sum(1 for t in legacy if start <= t <= end)
+        return (last[:10] if last else None), in_window
+
+    def visit_counts(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT substr(visited_at, 1, 10), kind, COUNT(*) FROM visits GROUP BY 1, 2"
+            ).fetchall()
+        return {(day, kind): n for day, kind, n in rows}
+
+    def data_version(self):
+        # 쓰기마다 바뀌면 통계를 매번 다시 계산하므로 최대 60초에 한 번만 갱신 (sheets 의 TTL 재로딩과 같은 주기)
+        now = time.monotonic()
+        if self._published is None or now - self._published[1] >= self.version_interval:
+            self._published = (self._version, now)
+        return self._published[0]
+
+    # --- 시트 동기화 ---
+
+    def sync_visits(self, visit_worksheet) -> int:
+        """동기화 안 된 방문 이벤트를 방문기록 시트에 append_rows 1회로 반영"""
+        with self._lock:
+            pending = self._conn.execute(
+                "SELECT id, plate, visited_at, kind FROM visits WHERE synced = 0 ORDER BY id"
+            ).fetchall()
+        if not pending:
+            return 0
+        visit_worksheet.append_rows(
+            [visit_row(r["plate"], r["visited_at"], r["kind"]) for r in pending],
+            value_input_option="RAW",
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE visits SET synced = 1 WHERE synced = 0 AND id <= ?", (pending[-1]["id"],)
+            )
+        return len(pending)
+
+    @staticmethod
+    def _resolve_sheet_rows(worksheet, rows) -> dict:
+        """
+        A열 읽기 1회로 기록할 행 번호 확인 (보관 작업·다른 단말로 행이 밀렸을 수 있음)
+        → {seq: 실제 행 번호, 시트에 없으면 None}.
+        아직 붙이지 않은 행도 시트에 같은 차량번호가 있으면 그 행 (응답만 못 받은 append / 되돌린 보관 고객).
+        """
+        column = worksheet.col_values(1)
+        where = {}
+        for i, value in enumerate(column[1:], start=2):
+            where.setdefault(plate_key(value), i)
+        resolved = {}
+        for r in rows:
+            row = r["sheet_row"]
+            if row is None or row > len(column) or plate_key(column[row - 1]) != r["차량번호"]:
+                row = where.get(r["차량번호"])
+            resolved[r["seq"]] = row
+        return resolved
+
+    def _conflict(self, plate, row, reason):
+        self._conflicts.append({
+            "plate": plate, "row": row, "reason": reason, "at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+
+    def sync_to_sheet(self, worksheet) -> int:
+        """
+        변경된 행을 시트에 일괄 반영 (모두 RAW 문자열):
+        시트에 없는 행은 append_rows 1회, 있는 행은 batch_get 1회로 다시 읽고 바뀐 칸만 batch_update 1회.
+        """
+        with self._lock:
+            dirty = [dict(r) for r in self._conn.execute(
+                f"SELECT seq, sheet_row, {_COL_SQL} FROM customers WHERE dirty > 0 ORDER BY seq"
+            ).fetchall()]
+        if not dirty:
+            return 0
+        resolved = self._resolve_sheet_rows(worksheet, dirty)
+        new = [r for r in dirty if resolved[r["seq"]] is None]
+        if new:
+            self._append_rows(worksheet, new)
+        placed = [r for r in dirty if resolved[r["seq"]] is not None]
+        if placed:
+            self._update_rows(worksheet, placed, resolved)
+        return len(dirty)
+
+    def _append_rows(self, worksheet, rows: list):
+        # 행 전체를 보내므로 쌓인 변경은 비움 (붙이는 사이 들어온 수정은 pending 에 새로 쌓임)
+        with self._lock, self._conn:
+            current = []
+            for r in rows:
+                row = self._conn.execute(f"SELECT seq, dirty, {_COL_SQL} FROM customers WHERE seq = ?", (r["seq"],)).fetchone()
+                current.append(row)
+                self._conn.execute("UPDATE customers SET pending = '', sending = '' WHERE seq = ?", (r["seq"],))
+        response = worksheet.append_rows([[str(r[c]) for c in COLUMNS] for r in current], value_input_option="RAW")
+        start = _appended_start_row(response, worksheet, len(current))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE customers SET sheet_row = ?, "
+                "dirty = CASE WHEN dirty = ? THEN 0 ELSE dirty END WHERE seq = ?",
+                [(start + i, r["dirty"], r["seq"]) for i, r in enumerate(current)],
+            )
+
+    def _update_rows(self, worksheet, rows: list, resolved: dict):
+        last = col_letter(len(COLUMNS))
+        targets = [resolved[r["seq"]] for r in rows]
+        fresh = worksheet.batch_get([f"A{t}:{last}{t}" for t in targets])
+        updates, sent = {}, []
+        with self._lock, self._conn:
+            for r, target, values in zip(rows, targets, fresh):
+                sheet = row_to_record(values[0] if values else [])
+                if plate_key(sheet["차량번호"]) != r["차량번호"]:
+                    continue  # 읽는 사이 행이 밀림 → 다음 동기화 때 다시 찾음
+                row = self._conn.execute(
+                    f"SELECT pending, sending, {_q('버전')} FROM customers WHERE seq = ?", (r["seq"],)
+                ).fetchone()
+                changes = _load_changes(row["pending"])
+                expected = {str(row["버전"])}
+                if row["sending"]:
+                    prior = json.loads(row["sending"])
+                    expected.add(prior["token"])
+                    if str(sheet["버전"]) != prior["token"]:
+                        # 지난 전송이 반영되지 않음 → 그 변경부터 다시
+                        changes = merge_changes(decode_changes(prior["changes"]), changes)
+                out = {}
+                if changes:
+                    if str(sheet["버전"]) not in expected:
+                        self._conflict(r["차량번호"], target, "다른 단말에서 먼저 수정됨 (최신 값 기준으로 반영)")
+                    token = new_version()
+                    out = {name: str(v) for name, v in resolve_changes(sheet, changes).items()}
+                    out["버전"] = token
+                    updates[target] = out
+                    self._conn.execute(
+                        "UPDATE customers SET pending = '', sending = ? WHERE seq = ?",
+                        (json.dumps({"token": token, "changes": encode_changes(changes)}, ensure_ascii=False), r["seq"]),
+                    )
+                sent.append((r["seq"], target, {**sheet, **out}))
+        commit_many(worksheet, updates, value_input_option="RAW")
+
+        # 로컬 행 = 반영된 시트 행 (다른 단말 수정 포함) + 그사이 들어온 수정
+        names = COLUMNS[1:]
+        with self._lock, self._conn:
+            for seq, target, merged in sent:
+                later = _load_changes(self._conn.execute("SELECT pending FROM customers WHERE seq = ?", (seq,)).fetchone()[0])
+                local = {**merged, **resolve_changes(merged, later)}
+                self._conn.execute(
+                    f"UPDATE customers SET {', '.join(f'{_q(c)} = ?' for c in names)}, sheet_row = ?, sending = '', "
+                    "dirty = CASE WHEN pending = '' THEN 0 ELSE dirty END WHERE seq = ?",
+                    [str(local[c]) for c in names] + [target, seq],
+                )
+            self._version += 1
+
+    def start_sync(self, worksheet_getter, visit_worksheet_getter, interval: float = 30.0, max_interval: float = 300.0):
+        """백그라운드로 interval 초마다 쌓인 변경을 시트에 일괄 반영, 오류 시 간격을 늘림"""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            worksheet = visit_worksheet = None
+            wait = interval
+            while True:
+                self._sync_wakeup.wait(wait)
+                self._sync_wakeup.clear()
+                try:
+                    if worksheet is None:
+                        worksheet = worksheet_getter()
+                        visit_worksheet = visit_worksheet_getter()
+                    self.sync_to_sheet(worksheet)
+                    self.sync_visits(visit_worksheet)
+                    self._sync_attempt, self._sync_error, wait = 0, "", interval
+                except Exception as e:
+                    self._sync_attempt += 1
+                    self._sync_error = f"{type(e).__name__}: {e}"
+                    if not is_retryable(e):
+                        worksheet = visit_worksheet = None
+                    wait = min(max_interval, interval * 2 ** self._sync_attempt)
+
+        self._sync_thread = threading.Thread(target=run, name="oasis-sqlite-sync", daemon=True)
+        self._sync_thread.start()
+
+    def status(self):
+        with self._lock:
+            pending = self._conn.execute("SELECT COUNT(*) FROM customers WHERE dirty > 0").fetchone()[0]
+            pending += self._conn.execute("SELECT COUNT(*) FROM visits WHERE synced = 0").fetchone()[0]
+        return {
+            "pending": pending,
+            "failed": 0,
+            "attempt": self._sync_attempt,
+            "last_error": self._sync_error,
+            "failed_items": [],
+            "conflicts": list(self._conflicts),
+            "offline": "",
+            "snapshot_at": None,
+        }
+
+    def retry_failed(self):
+        self._sync_wakeup.set()
+
+    def clear_conflicts(self):
+        self._conflicts.clear()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""oasis_visits.py - 방문 이벤트 로그 (별도 시트에 append 전용) + 고객별 집계"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import timedelta
+
+from oasis_index import plate_key
+from oasis_sheet import PLAN_DAYS
+
+VISIT_SHEET = "방문기록"
+VISIT_HEADER = ["차량번호", "방문일시", "유형", "키"]  # 키: 중복 전송 방지용
+
+_LEGACY_ENTRY = re.compile(r"^(\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2})?)\s*(?:\((.*)\))?$")
+
+
+def ensure_visit_worksheet(spreadsheet):
+    """'방문기록' 시트를 열고, 없으면 헤더만 있는 새 시트를 만든다. (예전 시트면 빠진 헤더를 채움)"""
+    for ws in spreadsheet.worksheets():
+        if ws.title == VISIT_SHEET:
+            header = ws.row_values(1)
+            if len(header) < len(VISIT_HEADER):
+                ws.batch_update([{"range": "A1:D1", "values": [list(header) + VISIT_HEADER[len(header):]]}])
+            return ws
+    ws = spreadsheet.add_worksheet(title=VISIT_SHEET, rows=1, cols=len(VISIT_HEADER))
+    ws.append_row(VISIT_HEADER)
+    return ws
+
+def visit_row(plate, when: str, kind: str, key: str = "") -> list:
+    """이벤트 시트 1행: [차량번호, 'YYYY-MM-DD HH:MM', 유형, 키]"""
+    return [plate_key(plate), when, kind, key]
+
+def parse_legacy_entries(visit_str) -> list:
+    """기존 L열 '일시 (유형), ...' 문자열 → [(방문일시, 유형)] (형식이 깨진 항목은 건너뜀)"""
+    entries = []
+    for log in str(visit_str or "").split(","):
+        m = _LEGACY_ENTRY.match(log.strip())
+        if m:
+            entries.append((m.group(1), m.group(2) or ""))
+    return entries
+
+def parse_legacy_log(visit_str) -> list:
+    """기존 L열 → 방문일시 목록"""
+    return [when for when, _ in parse_legacy_entries(visit_str)]
+
+
+class VisitLog:
+    """
+    차량번호별 방문일시 정렬 목록.
+    최근 방문일은 마지막 원소, 정액제 기간 내 횟수는 이진 탐색으로 바로 구한다.
+    L열(이관 전 기록)은 고객을 처음 조회할 때 한 번만 합친다.
+    daily 는 이벤트 시트 기준 (날짜, 유형) 별 방문 수 (통계용, L열 제외).
+    """
+
+    def __init__(self):
+        self._times = {}
+        self._legacy_done = set()
+        self._local = Counter()
+        self.daily = Counter()
+
+    def add(self, plate, when: str, local: bool = False, kind: str = None):
+        if kind is not None:
+            self.daily[(when[:10], kind)] += 1
+        plate = plate_key(plate)
+        times = self._times.setdefault(plate, [])
+        if not times or times[-1] <= when:
+            times.append(when)
+        else:
+            times.insert(bisect_right(times, when), when)
+        if local:
+            self._local[(plate, when)] += 1
+
+    def add_rows(self, rows: list):
+        """이벤트 시트에서 읽은 행 추가. 이 프로세스가 이미 add(local=True) 한 행은 건너뜀"""
+        for row in rows:
+            if len(row) < 2 or not row[0] or not row[1]:
+                continue
+            key = (plate_key(row[0]), str(row[1]))
+            if self._local[key] > 0:
+                self._local[key] -= 1
+                continue
+            self.add(key[0], key[1], kind=str(row[2]) if len(row) > 2 else "")
+
+    def _merge_legacy(self, customer: dict):
+        plate = plate_key(customer.get("차량번호"))
+        if plate in self._legacy_done:
+            return
+        self._legacy_done.add(plate)
+        legacy = parse_legacy_log(customer.get("방문기록", ""))
+        if legacy:
+            self._times[plate] = sorted(legacy + self._times.get(plate, []))
+
+    def summary(self, customer: dict, expire_date=None):
+        """→ (최근 방문일 'YYYY-MM-DD' 또는 None, 정액제 기간[만료 30일 전 ~ 만료일] 내 방문 횟수)"""
+        self._merge_legacy(customer)
+        times = self._times.get(plate_key(customer.get("차량번호")), [])
+        last = times[-1][:10] if times else None
+        in_window = 0
+        if expire_date is not None:
+            start = (expire_date - timedelta(days=PLAN_DAYS)).strftime("%Y-%m-%d")
+            end = expire_date.strftime("%Y-%m-%d")
+            in_window = bisect_right(times, end + "~") - bisect_left(times, start)
+        return last, in_window
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""쓰기 큐 회귀 테스트 (oasis_bench 의 가짜 gspread 사용)
+
+    python -m pytest -q
+"""
+
+import time
+
+from oasis_bench import FakeClient, FakeSpreadsheet, Meter, synthetic_sheet
+from oasis_sheet import memo_changes
+from oasis_storage import SheetsStorage
+from oasis_visits import ensure_visit_worksheet
+
+
+def _storage(n=20):
+    meter = Meter()
+    customers, visits, plates = synthetic_sheet(n, seed=1)
+    spreadsheet = FakeClient(FakeSpreadsheet(meter, {"Sheet1": customers, "방문기록": visits})).open_by_key("test")
+    worksheet = spreadsheet.sheet1
+    visit_worksheet = ensure_visit_worksheet(spreadsheet)
+    storage = SheetsStorage(lambda: worksheet, lambda: visit_worksheet, ttl=3600)
+    storage.load()
+    return storage, meter, worksheet, plates
+
+
+def _hold_writes(storage, meter):
+    """쓰기를 모두 429 로 실패시켜 큐에 남겨 둠 (워커는 첫 실패 뒤 오래 대기)"""
+    storage.queue.max_retries = None
+    storage.queue.base_delay = 60
+    meter.quota_rate = 1.0
+
+
+def _wait_first_failure(storage, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while storage.status()["attempt"] < 1:
+        assert time.monotonic() < deadline, "쓰기 큐가 한 번도 시도하지 않음"
+        time.sleep(0.01)
+
+
+def test_overlay_follows_plate_when_rows_shift():
+    storage, meter, worksheet, plates = _storage()
+    _hold_writes(storage, meter)
+    storage.update(plates[2], memo_changes("회귀 테스트 메모"))
+    _wait_first_failure(storage)
+
+    # 다른 단말의 보관 이동처럼 위쪽 행이 지워져 아래 행이 한 칸씩 올라감
+    meter.quota_rate = 0.0
+    worksheet.delete_rows(2)
+    storage.load(force=True)
+
+    assert storage.get(plates[2])["메모"] == "회귀 테스트 메모"
+    assert storage.get(plates[3])["메모"] != "회귀 테스트 메모"
+    assert storage.get(plates[0]) is None
+
+
+def test_overlay_skips_plate_missing_after_reload():
+    storage, meter, worksheet, plates = _storage()
+    _hold_writes(storage, meter)
+    storage.update(plates[0], memo_changes("지워진 고객 메모"))
+    _wait_first_failure(storage)
+
+    meter.quota_rate = 0.0
+    worksheet.delete_rows(2)
+    records = storage.load(force=True)
+
+    assert all(r["메모"] != "지워진 고객 메모" for r in records)
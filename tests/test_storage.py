@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""시트가 끊겼을 때의 SheetsStorage 회귀 테스트 (oasis_bench 의 가짜 gspread 사용)"""
+
+from oasis_archive import ARCHIVE_SHEET
+from oasis_bench import FakeClient, FakeSpreadsheet, Meter, synthetic_sheet
+from oasis_journal import Journal
+from oasis_sheet import COLUMNS
+from oasis_storage import SheetsStorage
+from oasis_visits import ensure_visit_worksheet
+
+
+class Sheets:
+    """down=True 면 모든 시트 열기가 ConnectionError"""
+
+    def __init__(self, n=20):
+        customers, visits, self.plates = synthetic_sheet(n, seed=2)
+        sheets = {"Sheet1": customers, "방문기록": visits, ARCHIVE_SHEET: [list(COLUMNS)]}
+        self.spreadsheet = FakeClient(FakeSpreadsheet(Meter(), sheets)).open_by_key("test")
+        self.visit_worksheet = ensure_visit_worksheet(self.spreadsheet)
+        self.down = False
+
+    def _open(self, worksheet):
+        if self.down:
+            raise ConnectionError("down")
+        return worksheet
+
+    def storage(self, **kwargs):
+        return SheetsStorage(
+            lambda: self._open(self.spreadsheet.sheet1),
+            lambda: self._open(self.visit_worksheet),
+            ttl=3600,
+            archive_worksheet_getter=lambda: self._open(self.spreadsheet.worksheet(ARCHIVE_SHEET)),
+            timeout=1,
+            **kwargs,
+        )
+
+
+def test_offline_from_archive_read_keeps_snapshot_time():
+    sheets = Sheets()
+    storage = sheets.storage()
+    storage.load()
+    sheets.down = True
+
+    assert storage.search("0000") == []
+    status = storage.status()
+    assert status["offline"] == "ConnectionError: down"
+    assert status["snapshot_at"] is not None
+
+
+def test_recovered_visits_count_after_offline_restart(tmp_path):
+    sheets = Sheets()
+    plate = sheets.plates[0]
+    storage = sheets.storage(journal=Journal(str(tmp_path / "journal.db")))
+    storage.load()
+    sheets.down = True
+    storage.append_visit(plate, "2030-01-01 10:00", "정액제")
+    assert storage.visit_summary(storage.get(plate))[0] == "2030-01-01"
+
+    # 시트가 끊긴 채로 재시작: 저널 저장본 + 되살린 방문으로 보여줌
+    restarted = sheets.storage(journal=Journal(str(tmp_path / "journal.db")))
+    restarted.load()
+    assert restarted.status()["offline"]
+    assert restarted.visit_summary(restarted.get(plate))[0] == "2030-01-01"